@@ -0,0 +1,272 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote, parse_qs
+
+CELL_PATTERN = re.compile(r'^[A-Z]+(\d+)?')
+
+
+class FakeServer:
+    def __init__(self, handler, latency=0, error_rate=0, seed=0):
+        self.calls = Counter()
+        self.errors = Counter()
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.fake = self
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def count(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+
+    def get_error(self):
+        with self.lock:
+            if not self.error_rate or self.random.random() >= self.error_rate:
+                return None
+            status = self.random.choice((429, 500, 503))
+            self.errors[status] += 1
+            return status
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def inject_error(self):
+        status = self.server.fake.get_error()
+        if status is None:
+            return False
+        self.read_json()
+        headers = {'Retry-After': '0.1'} if status == 429 else {}
+        self.respond(status, {'message': 'Injected error', 'retry_after': 0.1}, headers)
+        return True
+
+    def respond(self, status, payload=None, headers=None):
+        if self.server.fake.latency:
+            time.sleep(self.server.fake.latency)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ChallongeHandler(FakeHandler):
+    def do_GET(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts[:2] != ['v1', 'tournaments'] or len(parts) < 3:
+            self.respond(404, {'errors': ['Not found']})
+            return
+        parts = [part.removesuffix('.json') for part in parts[2:]]
+        with fake.tournament_lock:
+            tournament = fake.tournament
+            if parts[0] not in (str(tournament.id), tournament.url):
+                self.respond(404, {'errors': ['Not found']})
+                return
+            if len(parts) == 1:
+                fake.count('tournaments.show')
+                payload = {'tournament': {'id': tournament.id, 'url': tournament.url, 'state': tournament.state,
+                                          'tournament_type': tournament.tournament_type,
+                                          'updated_at': tournament.updated_at}}
+            elif parts[1] == 'participants':
+                fake.count('participants.index')
+                payload = [{'participant': dict(participant)} for participant in tournament.participants]
+            elif parts[1] == 'matches' and len(parts) == 2:
+                fake.count('matches.index')
+                payload = [{'match': dict(match)} for match in tournament.matches.values()]
+            elif parts[1] == 'matches' and int(parts[2]) in tournament.matches:
+                fake.count('matches.show')
+                payload = {'match': dict(tournament.matches[int(parts[2])])}
+            else:
+                self.respond(404, {'errors': ['Not found']})
+                return
+        self.respond(200, payload)
+
+
+class FakeChallonge(FakeServer):
+    def __init__(self, tournament, latency=0, error_rate=0):
+        super().__init__(ChallongeHandler, latency, error_rate, seed=1)
+        self.tournament = tournament
+        self.tournament_lock = threading.Lock()
+
+    def report_burst(self, burst_size):
+        with self.tournament_lock:
+            return self.tournament.report_burst(burst_size)
+
+
+def parse_range(range_name):
+    range_name = unquote(range_name)
+    sheet_list, _, cells = range_name.rpartition('!')
+    start, _, end = cells.partition(':')
+    first = CELL_PATTERN.match(start)
+    last = CELL_PATTERN.match(end) if end else first
+    first_row = int(first.group(1)) if first and first.group(1) else 1
+    last_row = int(last.group(1)) if last and last.group(1) else None
+    return sheet_list, first_row, last_row
+
+
+class SheetsHandler(FakeHandler):
+    def get_values_path(self):
+        path = urlparse(self.path).path
+        match = re.match(r'^/v4/spreadsheets/[^/]+/values(?:/([^:]+))?(?::(\w+))?$', path)
+        return match.groups() if match else (None, None)
+
+    def do_GET(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        if urlparse(self.path).path.startswith('/files/'):
+            fake.count('files.get')
+            self.respond(200, {'version': str(fake.version)})
+            return
+        range_name, action = self.get_values_path()
+        if action == 'batchGet':
+            fake.count('values.batchGet')
+            value_ranges = []
+            for range_name in parse_qs(urlparse(self.path).query).get('ranges', []):
+                _, first_row, last_row = parse_range(range_name)
+                with fake.lock:
+                    values = [list(row) for row in fake.rows[first_row - 1:last_row or first_row]]
+                value_ranges.append({'range': range_name, 'values': values})
+            self.respond(200, {'valueRanges': value_ranges})
+            return
+        if range_name is None:
+            self.respond(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+        fake.count('values.get')
+        sheet_list, first_row, last_row = parse_range(range_name)
+        with fake.lock:
+            rows = fake.rows[first_row - 1:last_row]
+            values = [list(row) for row in rows]
+        while values and not values[-1]:
+            values.pop()
+        self.respond(200, {'range': unquote(range_name), 'values': values})
+
+    def do_PUT(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        range_name, _ = self.get_values_path()
+        body = self.read_json()
+        fake.count('values.update')
+        _, first_row, _ = parse_range(range_name)
+        fake.write_rows(first_row, body.get('values', []))
+        self.respond(200, {'updatedCells': sum(len(row) for row in body.get('values', []))})
+
+    def do_POST(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        range_name, action = self.get_values_path()
+        body = self.read_json()
+        if action == 'append':
+            fake.count('values.append')
+            sheet_list, _, _ = parse_range(range_name)
+            values = body.get('values', [])
+            with fake.lock:
+                first_row = len(fake.rows) + 1
+                fake.rows.extend([[str(value) for value in row] for row in values])
+                fake.version += 1
+            updated_range = f'{sheet_list}!A{first_row}:F{first_row + len(values) - 1}'
+            self.respond(200, {'updates': {'updatedRange': updated_range, 'updatedRows': len(values)}})
+        elif action == 'batchUpdate':
+            fake.count('values.batchUpdate')
+            cells = 0
+            with fake.lock:
+                fake.version += 1
+                for item in body.get('data', []):
+                    _, first_row, _ = parse_range(item['range'])
+                    fake.write_rows(first_row, item['values'], first_column=1, changes=0)
+                    cells += sum(len(row) for row in item['values'])
+            self.respond(200, {'totalUpdatedCells': cells})
+        else:
+            self.respond(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+
+class FakeSheets(FakeServer):
+    def __init__(self, rows, header_rows=1, latency=0, error_rate=0):
+        super().__init__(SheetsHandler, latency, error_rate, seed=2)
+        self.rows = [['username', 'elo', 'calibration', 'matches', 'wins', 'tournaments']][:header_rows]
+        self.rows.extend([[str(value) for value in row] for row in rows])
+        self.version = 1
+
+    def write_rows(self, first_row, values, first_column=0, changes=1):
+        with self.lock:
+            self.version += changes
+            for offset, row in enumerate(values):
+                position = first_row - 1 + offset
+                while len(self.rows) <= position:
+                    self.rows.append([])
+                current = self.rows[position]
+                while len(current) < first_column + len(row):
+                    current.append('')
+                current[first_column:first_column + len(row)] = [str(value) for value in row]
+
+
+class DiscordHandler(FakeHandler):
+    def do_POST(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        body = self.read_json()
+        fake.count('webhook.post')
+        with fake.lock:
+            fake.embeds += len(body.get('embeds', []))
+            fake.message_id += 1
+            message_id = fake.message_id
+        if 'wait=true' in urlparse(self.path).query:
+            self.respond(200, {'id': str(message_id)}, fake.get_rate_limit_headers())
+        else:
+            self.respond(204, headers=fake.get_rate_limit_headers())
+
+    def do_PATCH(self):
+        if self.inject_error():
+            return
+        fake = self.server.fake
+        self.read_json()
+        fake.count('webhook.edit')
+        self.respond(200, {'id': self.path.rsplit('/', 1)[-1]}, fake.get_rate_limit_headers())
+
+
+class FakeDiscord(FakeServer):
+    def __init__(self, latency=0, error_rate=0):
+        super().__init__(DiscordHandler, latency, error_rate, seed=3)
+        self.embeds = 0
+        self.message_id = 0
+
+    def get_rate_limit_headers(self):
+        return {'X-RateLimit-Limit': '5', 'X-RateLimit-Remaining': '4', 'X-RateLimit-Reset-After': '0'}
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+SCENARIO_SCRIPT = os.path.join(BENCHMARKS_DIR, 'scenario.py')
+DEFAULT_PLAYERS = [8, 64, 256, 1024]
+DEFAULT_TYPES = ['single elimination', 'double elimination']
+COMPARED_METRICS = (
+    ('elapsed', lambda result: result['elapsed']),
+    ('cycle p95 ms', lambda result: result['cycles']['p95_ms']),
+    ('challonge calls/match', lambda result: result['calls_per_match']['challonge']),
+    ('sheets calls/match', lambda result: result['calls_per_match']['sheets']),
+    ('discord calls/match', lambda result: result['calls_per_match']['discord']),
+    ('peak rss mb', lambda result: result['peak_rss_mb']),
+)
+
+
+def get_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_scenario(players, tournament_type, extra_args):
+    command = [sys.executable, SCENARIO_SCRIPT, '--players', str(players), '--type', tournament_type] + extra_args
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Scenario {tournament_type} {players} failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_result(result):
+    print(f"{result['scenario']:>12}: {result['matches']} matches in {result['elapsed']:.2f}s, "
+          f"{result['cycles']['count']} cycles (mean {result['cycles']['mean_ms']:.1f}ms, "
+          f"p95 {result['cycles']['p95_ms']:.1f}ms), calls/match "
+          + ', '.join(f'{name} {value:.2f}' for name, value in result['calls_per_match'].items())
+          + f", peak RSS {result['peak_rss_mb']:.0f}MB")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {result['scenario']: result for result in json.load(file)['results']}
+    print(f'Compared with {baseline_path}:')
+    for result in results:
+        previous = baseline.get(result['scenario'])
+        if previous is None:
+            continue
+        changes = []
+        for name, get_value in COMPARED_METRICS:
+            old, new = get_value(previous), get_value(result)
+            change = (new - old) / old * 100 if old else 0
+            changes.append(f'{name} {old:g} -> {new:g} ({change:+.0f}%)')
+        print(f"{result['scenario']:>12}: " + '; '.join(changes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the synthetic tournament benchmarks and store the results")
+    parser.add_argument('--players', type=int, action='append', help='Tournament size, can be repeated')
+    parser.add_argument('--type', choices=DEFAULT_TYPES, action='append', help='Bracket type, can be repeated')
+    parser.add_argument('--label', type=str, help='Name of the results file, defaults to time and git revision')
+    parser.add_argument('--compare', type=str, help='Earlier results file to compare against')
+    args, extra_args = parser.parse_known_args()
+
+    revision = get_revision()
+    results = []
+    for tournament_type in args.type or DEFAULT_TYPES:
+        for players in args.players or DEFAULT_PLAYERS:
+            result = run_scenario(players, tournament_type, extra_args)
+            print_result(result)
+            results.append(result)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    label = args.label or f'{time.strftime("%Y%m%d-%H%M%S")}-{revision}'
+    path = os.path.join(RESULTS_DIR, f'{label}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'revision': revision, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'arguments': extra_args,
+                   'results': results}, file, indent=2)
+    print(f'Results written to {path}')
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_servers import FakeChallonge, FakeSheets, FakeDiscord
+from synthetic import SyntheticTournament, TOURNAMENT_TYPES
+
+SHEET_LIST = 'Bench'
+
+
+def configure_environment(work_dir, args, discord):
+    os.environ.update({
+        'DATA_DIR': os.path.join(work_dir, 'data'),
+        'SHEET_ID': 'benchmark',
+        'SHEET_LIST': SHEET_LIST,
+        'SHEET_RANGE': 'A2:F',
+        'DISCORD_WEBHOOK_URL': f'{discord.url}/webhook',
+        'POLL_MIN_INTERVAL': str(args.poll_interval),
+        'POLL_MAX_INTERVAL': str(args.poll_interval * 4),
+        'SHEET_SYNC_INTERVAL': str(args.sync_interval),
+        'LOG_LEVEL': args.log_level,
+        'PROJECTION_SIMULATIONS': str(args.projection_simulations),
+    })
+    for service in ('CHALLONGE', 'SHEETS_READ', 'SHEETS_WRITE', 'DRIVE', 'DISCORD'):
+        os.environ.setdefault(f'QUOTA_{service}_RATE', '0')
+    os.environ.setdefault('QUOTA_BACKOFF_BASE', '0.05')
+    os.chdir(work_dir)
+
+
+def connect_challonge(challonge_server):
+    import challonge
+
+    os.environ['CHALLONGE_API_URL'] = f'{challonge_server.url}/v1'
+    challonge.set_credentials('benchmark', 'benchmark')
+
+
+def connect_sheets(sheets_server):
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build
+
+    import google_sheets_manager
+
+    credentials = AnonymousCredentials()
+    google_sheets_manager.connection['credentials'] = credentials
+    google_sheets_manager.connection['service'] = build('sheets', 'v4', credentials=credentials,
+                                                        static_discovery=True, cache_discovery=False,
+                                                        client_options={'api_endpoint': sheets_server.url})
+    google_sheets_manager.connection['drive'] = build('drive', 'v3', credentials=credentials,
+                                                      static_discovery=True, cache_discovery=False,
+                                                      client_options={'api_endpoint': sheets_server.url})
+
+
+def report_results(challonge_server, args, stop_event):
+    randomizer = random.Random(args.seed)
+    while not stop_event.is_set() and challonge_server.tournament.state != 'complete':
+        stop_event.wait(args.report_interval)
+        burst_size = randomizer.randint(1, args.burst_size)
+        challonge_server.report_burst(burst_size)
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))]
+
+
+def run_scenario(args):
+    if args.burst_size is None:
+        args.burst_size = max(4, args.players // 16)
+    tournament = SyntheticTournament(args.players, args.type, seed=args.seed)
+    roster = [[participant['name'], 1000, 0, 0, 0, 0] for participant in tournament.participants[:args.known_players]]
+    challonge_server = FakeChallonge(tournament, args.latency, args.error_rate).start()
+    sheets_server = FakeSheets(roster, latency=args.latency, error_rate=args.error_rate).start()
+    discord_server = FakeDiscord(args.latency, args.error_rate).start()
+    work_dir = tempfile.mkdtemp(prefix='challonge-benchmark-')
+    configure_environment(work_dir, args, discord_server)
+    connect_challonge(challonge_server)
+    connect_sheets(sheets_server)
+
+    import tournament_start
+    from sheets_mirror import stop_mirrors
+
+    session = tournament_start.TournamentSession(tournament_start.TournamentConfig(
+        tournament.url, scoreboard=args.scoreboard, projections=args.projection_simulations > 0))
+    cycles = []
+    poll_tournament = session.poll_tournament
+
+    def timed_poll_tournament(tournament_id):
+        started = time.perf_counter()
+        try:
+            return poll_tournament(tournament_id)
+        finally:
+            cycles.append(time.perf_counter() - started)
+
+    session.poll_tournament = timed_poll_tournament
+
+    stop_event = threading.Event()
+    reporter = threading.Thread(target=report_results, args=(challonge_server, args, stop_event), daemon=True)
+    started = time.perf_counter()
+    reporter.start()
+    session.start_polling(tournament.url)
+    stop_mirrors()
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    reporter.join()
+
+    matches = sum(1 for match in tournament.matches.values() if match['state'] == 'complete')
+    services = {'challonge': challonge_server, 'sheets': sheets_server, 'discord': discord_server}
+    calls = {name: dict(server.calls) for name, server in services.items()}
+    errors = {name: dict(server.errors) for name, server in services.items() if server.errors}
+    result = {
+        'scenario': f'{args.type.split()[0]}-{args.players}',
+        'players': args.players,
+        'type': args.type,
+        'matches': matches,
+        'elapsed': round(elapsed, 3),
+        'cycles': {
+            'count': len(cycles),
+            'mean_ms': round(statistics.mean(cycles) * 1000, 3) if cycles else 0,
+            'p95_ms': round(get_percentile(cycles, 0.95) * 1000, 3),
+            'max_ms': round(max(cycles, default=0) * 1000, 3),
+        },
+        'calls': calls,
+        'calls_per_match': {name: round(sum(counts.values()) / max(matches, 1), 3) for name, counts in calls.items()},
+        'injected_errors': errors,
+        'rated_matches': sum(1 for state in session.sent_messages.values() if state == 'complete'),
+        'embeds': discord_server.embeds,
+        'sheet_rows': len(sheets_server.rows) - 1,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    for server in services.values():
+        server.stop()
+    return result
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Run one synthetic tournament against local fake services")
+    parser.add_argument('--players', type=int, default=8, help='Number of players, a power of two from 4')
+    parser.add_argument('--type', choices=TOURNAMENT_TYPES, default='single elimination')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--report-interval', type=float, default=0.2, help='Seconds between result bursts')
+    parser.add_argument('--burst-size', type=int, default=None,
+                        help='Largest number of results reported at once, defaults to players // 16 (at least 4)')
+    parser.add_argument('--poll-interval', type=float, default=0.02, help='POLL_MIN_INTERVAL for the session')
+    parser.add_argument('--sync-interval', type=float, default=0.5, help='SHEET_SYNC_INTERVAL for the session')
+    parser.add_argument('--latency', type=float, default=0, help='Added latency of every fake API response')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of fake API responses that fail with 429/5xx')
+    parser.add_argument('--known-players', type=int, default=None,
+                        help='Players already in the sheet, the rest are added as new users')
+    parser.add_argument('--scoreboard', action='store_true', help='Use the live scoreboard')
+    parser.add_argument('--projection-simulations', type=int, default=0)
+    parser.add_argument('--log-level', type=str.upper, default='WARNING')
+    return parser
+
+
+if __name__ == '__main__':
+    print(json.dumps(run_scenario(get_parser().parse_args())))
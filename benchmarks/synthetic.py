@@ -0,0 +1,113 @@
+import random
+from datetime import datetime, timezone
+
+TOURNAMENT_TYPES = ('single elimination', 'double elimination')
+
+
+def get_timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SyntheticTournament:
+    def __init__(self, players_count, tournament_type='single elimination', seed=0, tournament_id=1):
+        if players_count < 4 or players_count & (players_count - 1):
+            raise ValueError('players_count must be a power of two, at least 4')
+        if tournament_type not in TOURNAMENT_TYPES:
+            raise ValueError(f'Unknown tournament type {tournament_type}')
+        self.id = tournament_id
+        self.url = f'bench{tournament_id}'
+        self.tournament_type = tournament_type
+        self.random = random.Random(seed)
+        self.state = 'underway'
+        self.updated_at = get_timestamp()
+        self.participants = [{'id': 1000 + position, 'name': f'player{position}', 'seed': position + 1}
+                             for position in range(players_count)]
+        self.matches = {}
+        self.build(players_count)
+
+    def add_match(self, round_number, player1=None, player2=None, prereq1=None, prereq2=None,
+                  loser1=False, loser2=False):
+        match_id = len(self.matches) + 1
+        self.matches[match_id] = {
+            'id': match_id,
+            'tournament_id': self.id,
+            'round': round_number,
+            'state': 'pending',
+            'player1_id': player1,
+            'player2_id': player2,
+            'player1_prereq_match_id': prereq1,
+            'player2_prereq_match_id': prereq2,
+            'player1_is_prereq_match_loser': loser1,
+            'player2_is_prereq_match_loser': loser2,
+            'winner_id': None,
+            'loser_id': None,
+            'scores_csv': '',
+            'updated_at': self.updated_at,
+            'completed_at': None,
+        }
+        return match_id
+
+    def build(self, players_count):
+        ids = [participant['id'] for participant in self.participants]
+        rounds = [[self.add_match(1, ids[position], ids[position + 1]) for position in range(0, players_count, 2)]]
+        while len(rounds[-1]) > 1:
+            previous = rounds[-1]
+            rounds.append([self.add_match(len(rounds) + 1, prereq1=previous[position], prereq2=previous[position + 1])
+                           for position in range(0, len(previous), 2)])
+        if self.tournament_type == 'double elimination':
+            self.build_losers_bracket(rounds)
+        for match in self.matches.values():
+            if match['player1_id'] is not None and match['player2_id'] is not None:
+                match['state'] = 'open'
+
+    def build_losers_bracket(self, rounds):
+        first = rounds[0]
+        losers = [self.add_match(-1, prereq1=first[position], prereq2=first[position + 1], loser1=True, loser2=True)
+                  for position in range(0, len(first), 2)] if len(first) > 1 else []
+        round_number = -2
+        for winners_round in rounds[1:]:
+            if len(losers) > len(winners_round):
+                losers = [self.add_match(round_number, prereq1=losers[position], prereq2=losers[position + 1])
+                          for position in range(0, len(losers), 2)]
+                round_number -= 1
+            losers = [self.add_match(round_number, prereq1=losers[position], prereq2=winners_round[position],
+                                     loser2=True) for position in range(len(winners_round))]
+            round_number -= 1
+        final = self.add_match(len(rounds) + 1, prereq1=rounds[-1][0], prereq2=losers[0])
+        self.add_match(len(rounds) + 2, prereq1=final, prereq2=final)
+
+    def open_matches(self):
+        return [match for match in self.matches.values() if match['state'] == 'open']
+
+    def report(self, match_id):
+        match = self.matches[match_id]
+        winner, loser = match['player1_id'], match['player2_id']
+        if self.random.random() < 0.5:
+            winner, loser = loser, winner
+        now = get_timestamp()
+        match.update(state='complete', winner_id=winner, loser_id=loser, updated_at=now, completed_at=now,
+                     scores_csv='2-1')
+        self.updated_at = now
+        for dependent in self.matches.values():
+            if dependent['state'] != 'pending':
+                continue
+            if dependent['player1_prereq_match_id'] == dependent['player2_prereq_match_id'] == match_id:
+                if winner == match['player1_id']:
+                    continue
+                dependent['player1_id'], dependent['player2_id'] = match['player1_id'], match['player2_id']
+            for side in ('player1', 'player2'):
+                if dependent[f'{side}_prereq_match_id'] == match_id and dependent[f'{side}_id'] is None:
+                    is_loser = dependent[f'{side}_is_prereq_match_loser']
+                    dependent[f'{side}_id'] = loser if is_loser else winner
+            if dependent['player1_id'] is not None and dependent['player2_id'] is not None:
+                dependent.update(state='open', updated_at=now)
+        if not self.open_matches():
+            self.state = 'complete'
+
+    def report_burst(self, burst_size):
+        open_matches = self.open_matches()
+        self.random.shuffle(open_matches)
+        reported = open_matches[:burst_size]
+        for match in reported:
+            self.report(match['id'])
+        return len(reported)
@@ -0,0 +1,194 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+
+from dotenv import load_dotenv, find_dotenv
+
+from logger import get_logger
+from metrics import registry, track_call
+from quota import get_bucket, get_backoff, get_retry_after, is_transient, MAX_RETRIES, PRIORITY_POLL
+
+load_dotenv(find_dotenv(), verbose=True, override=True)
+
+logger = get_logger(os.path.basename(__file__))
+
+CHALLONGE_API_URL = os.getenv('CHALLONGE_API_URL', 'https://api.challonge.com/v1')
+
+
+class ChallongeResponse:
+    def __init__(self, status_code, reason, headers, text):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.text = text
+
+
+class ChallongeHTTPError(Exception):
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
+
+
+def copy_result(result):
+    if isinstance(result, list):
+        return [dict(item) for item in result]
+    return dict(result)
+
+
+class ChallongeClient:
+    POOL_SIZE = int(os.getenv('CHALLONGE_POOL_SIZE', 8))
+    TIMEOUT = float(os.getenv('CHALLONGE_TIMEOUT', 15))
+    KEEPALIVE_TIMEOUT = float(os.getenv('CHALLONGE_KEEPALIVE_TIMEOUT', 60))
+
+    def __init__(self, base_url=CHALLONGE_API_URL):
+        self.base_url = base_url.rstrip('/')
+        self.bucket = get_bucket('challonge')
+        self.loop = None
+        self.thread = None
+        self.session = None
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name="challonge-client", daemon=True)
+                self.thread.start()
+                logger.debug('Challonge client started for %s', self.base_url)
+            return self.loop
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start()).result()
+
+    def get_session(self):
+        if self.session is None:
+            import aiohttp
+            from challonge import api as challonge_api
+
+            connector = aiohttp.TCPConnector(limit=self.POOL_SIZE, keepalive_timeout=self.KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.TIMEOUT),
+                                                 headers={'User-Agent': challonge_api.user_agent})
+        return self.session
+
+    async def request(self, uri, params=()):
+        import aiohttp
+        from challonge import api as challonge_api
+
+        user, api_key = challonge_api.get_credentials()
+        auth = aiohttp.BasicAuth(user, api_key) if user and api_key else None
+        url = f'{self.base_url}/{uri}.json'
+        try:
+            async with self.get_session().get(url, params=list(params), auth=auth) as response:
+                text = await response.text()
+        except aiohttp.ClientConnectionError as ex:
+            raise ConnectionError(f'Challonge request to {url} failed: {ex}') from ex
+        if response.status == 422:
+            errors = json.loads(text).get('errors')
+            if errors:
+                raise challonge_api.ChallongeException(*errors)
+        if response.status >= 400:
+            raise ChallongeHTTPError(f'{response.status} Error: {response.reason} for url: {url}',
+                                     ChallongeResponse(response.status, response.reason, response.headers, text))
+        return challonge_api._parse(json.loads(text))
+
+    async def fetch_with_quota(self, uri, operation, priority, params=()):
+        for attempt in range(MAX_RETRIES):
+            await asyncio.to_thread(self.bucket.acquire, priority)
+            try:
+                with track_call('challonge', operation):
+                    return await self.request(uri, params)
+            except Exception as ex:
+                if attempt == MAX_RETRIES - 1 or not is_transient(ex):
+                    raise
+                retry_after = get_retry_after(ex)
+                if retry_after:
+                    self.bucket.penalize(retry_after)
+                delay = get_backoff(attempt)
+                logger.warning('challonge request failed, retry %s of %s in %.2fs. ERROR: %s', attempt + 1,
+                               MAX_RETRIES - 1, delay, ex)
+                await asyncio.sleep(delay)
+
+    async def fetch(self, uri, operation, priority=PRIORITY_POLL, params=()):
+        key = (uri, params)
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.fetch_with_quota(uri, operation, priority, params))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            registry.increment('external_calls_coalesced_total', (('service', 'challonge'), ('operation', operation)))
+            logger.debug('Joining the in-flight %s request for %s', operation, uri)
+        return copy_result(await asyncio.shield(future))
+
+    async def fetch_all(self, *requests, return_exceptions=False):
+        return await asyncio.gather(*(self.fetch(*request) for request in requests),
+                                    return_exceptions=return_exceptions)
+
+    def show_tournament(self, tournament, priority=PRIORITY_POLL):
+        return self.run(self.fetch(f'tournaments/{tournament}', 'tournaments.show', priority))
+
+    def index_matches(self, tournament, priority=PRIORITY_POLL):
+        return self.run(self.fetch(f'tournaments/{tournament}/matches', 'matches.index', priority))
+
+    def show_match(self, tournament, match_id, priority=PRIORITY_POLL):
+        return self.run(self.fetch(f'tournaments/{tournament}/matches/{match_id}', 'matches.show', priority))
+
+    def index_participants(self, tournament, priority=PRIORITY_POLL):
+        return self.run(self.fetch(f'tournaments/{tournament}/participants', 'participants.index', priority))
+
+    def index_tournaments(self, priority=PRIORITY_POLL, **params):
+        from challonge import api as challonge_api
+
+        params = tuple(challonge_api._prepare_params(params))
+        return self.run(self.fetch('tournaments', 'tournaments.index', priority, params))
+
+    def show_tournament_with_matches(self, tournament, priority=PRIORITY_POLL):
+        return self.run(self.fetch_all((f'tournaments/{tournament}', 'tournaments.show', priority),
+                                       (f'tournaments/{tournament}/matches', 'matches.index', priority)))
+
+    def index_participants_with_matches(self, tournament, priority=PRIORITY_POLL, matches_priority=PRIORITY_POLL):
+        return self.run(self.fetch_all((f'tournaments/{tournament}/participants', 'participants.index', priority),
+                                       (f'tournaments/{tournament}/matches', 'matches.index', matches_priority),
+                                       return_exceptions=True))
+
+    async def close_session(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def close(self):
+        with self.lock:
+            if self.loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self.close_session(), self.loop).result(self.TIMEOUT)
+            except Exception as ex:
+                logger.error('Failed to close the Challonge client session. ERROR: %s', ex)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
+
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_client(base_url=None):
+    base_url = base_url or CHALLONGE_API_URL
+    with clients_lock:
+        if base_url not in clients:
+            clients[base_url] = ChallongeClient(base_url)
+        return clients[base_url]
+
+
+@atexit.register
+def close_clients():
+    with clients_lock:
+        for client in clients.values():
+            client.close()
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+
+from logger import get_logger
+from users import User
+
+logger = get_logger(os.path.basename(__file__))
+
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+CHECKPOINT_PATH = os.path.join(DATA_DIR, 'checkpoint.sqlite3')
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+PLAYER_FIELDS = ('id', 'elo', 'calibration', 'matches_played', 'matches_won', 'tournaments_played', 'rating_sum',
+                 'r_win', 'r_lose')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tournaments (
+    tournament_url TEXT PRIMARY KEY,
+    tournament_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    tournament_url TEXT NOT NULL,
+    match_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (tournament_url, match_id)
+);
+CREATE TABLE IF NOT EXISTS players (
+    tournament_url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    elo INTEGER NOT NULL,
+    calibration INTEGER NOT NULL,
+    matches_played INTEGER NOT NULL,
+    matches_won INTEGER NOT NULL,
+    tournaments_played INTEGER NOT NULL,
+    rating_sum INTEGER NOT NULL,
+    r_win INTEGER NOT NULL,
+    r_lose INTEGER NOT NULL,
+    PRIMARY KEY (tournament_url, username)
+);
+"""
+
+PLAYER_UPSERT = (
+    f"INSERT INTO players VALUES ({', '.join('?' * (len(PLAYER_FIELDS) + 3))}) "
+    f"ON CONFLICT (tournament_url, username) DO UPDATE SET "
+    f"{', '.join(f'{field} = excluded.{field}' for field in PLAYER_FIELDS)}"
+)
+
+
+class TournamentCheckpoint:
+    def __init__(self, tournament_url, path=CHECKPOINT_PATH):
+        self.tournament_url = tournament_url
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def exists(self):
+        with self.lock:
+            row = self.connection.execute("SELECT 1 FROM tournaments WHERE tournament_url = ?",
+                                          (self.tournament_url,)).fetchone()
+        return row is not None
+
+    def save_players(self, players, positions=None):
+        self.connection.executemany(PLAYER_UPSERT, [
+            (self.tournament_url, positions[index] if positions else 0, player.username) +
+            tuple(getattr(player, field) for field in PLAYER_FIELDS)
+            for index, player in enumerate(players)])
+
+    def record_lineup(self, tournament_id, players):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO tournaments VALUES (?, ?)",
+                                    (self.tournament_url, tournament_id))
+            self.save_players(players, positions=range(len(players)))
+        logger.debug('Checkpoint created for tournament %s', self.tournament_url)
+
+    def record_match(self, match_id, state, players):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO matches VALUES (?, ?, ?)",
+                                    (self.tournament_url, match_id, state))
+            self.save_players(players)
+        logger.debug('Checkpoint updated. Match - %s. State - %s', match_id, state)
+
+    def load(self):
+        with self.lock:
+            tournament = self.connection.execute("SELECT tournament_id FROM tournaments WHERE tournament_url = ?",
+                                                 (self.tournament_url,)).fetchone()
+            if tournament is None:
+                return None
+            matches = self.connection.execute("SELECT match_id, state FROM matches WHERE tournament_url = ?",
+                                              (self.tournament_url,)).fetchall()
+            players = self.connection.execute(
+                f"SELECT username, {', '.join(PLAYER_FIELDS)} FROM players WHERE tournament_url = ? "
+                f"ORDER BY position", (self.tournament_url,)).fetchall()
+        users = [User(username=row[0], **dict(zip(PLAYER_FIELDS, row[1:]))) for row in players]
+        logger.debug('Checkpoint loaded for tournament %s. %s matches, '
+                     '%s players', self.tournament_url, len(matches), len(users))
+        return {
+            'tournament_id': tournament[0],
+            'sent_messages': dict(matches),
+            'users': users,
+        }
+
+    def finish(self):
+        with self.lock, self.connection:
+            for table in ('tournaments', 'matches', 'players'):
+                self.connection.execute(f"DELETE FROM {table} WHERE tournament_url = ?", (self.tournament_url,))
+        logger.debug('Checkpoint removed for tournament %s', self.tournament_url)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
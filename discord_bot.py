@@ -1,11 +1,17 @@
+import atexit
 import os
+import queue
+import threading
+import time
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
 
 from dotenv import load_dotenv, find_dotenv
 
 from logger import get_logger
+from metrics import registry, observe_announcement
+from quota import get_bucket, get_backoff, PRIORITY_ANNOUNCE, PRIORITY_COSMETIC
 
 load_dotenv(find_dotenv(), verbose=True, override=True)
 
@@ -14,13 +20,231 @@ logger = get_logger(os.path.basename(__file__))
 webhook_url = (os.getenv("DISCORD_WEBHOOK_URL"))
 logger.debug("Starting discord sender application")
 
+STOP = object()
 
-def send_message(message):
-    message['color'] = os.getenv("EMBEDS_COLOR")
-    mess = {
-        'embeds': [message]
-    }
-    response = requests.post(webhook_url, data=json.dumps(mess), headers={'Content-Type': 'application/json'})
-    if response.status_code != 204:
-        error_message = f'Request to webhook returned an error {response.status_code},the response is:\n{response.text}'
-        raise ValueError(error_message)
+
+class MessageEdit:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+def get_embed_size(embed):
+    size = len(embed.get('title', '')) + len(embed.get('description', ''))
+    size += len(embed.get('footer', {}).get('text', ''))
+    for field in embed.get('fields', []):
+        size += len(field.get('name', '')) + len(field.get('value', ''))
+    return size
+
+
+class DiscordSender:
+    MAX_EMBEDS = 10
+    MAX_EMBEDS_SIZE = 6000
+    MAX_RETRIES = 5
+    TIMEOUT = 10
+    DEFAULT_RETRY_AFTER = 1
+
+    def __init__(self, webhook_url):
+        self.webhook_url = webhook_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.blocked_until = 0
+        self.pending_edits = {}
+        self.edits_lock = threading.Lock()
+        self.timings = {}
+        self.bucket = get_bucket('discord', webhook_url)
+
+    def send(self, embed, timings=None):
+        embed['color'] = os.getenv("EMBEDS_COLOR")
+        if timings:
+            self.timings[id(embed)] = timings
+        self.enqueue(embed)
+
+    def observe_timings(self, key):
+        for started_at, source in self.timings.pop(key, ()):
+            observe_announcement(started_at, source)
+
+    def enqueue(self, item):
+        self.queue.put(item)
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="discord-sender", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        pending = None
+        while True:
+            embed = pending if pending is not None else self.queue.get()
+            pending = None
+            if embed is STOP:
+                self.queue.task_done()
+                return
+            if isinstance(embed, MessageEdit):
+                try:
+                    self.deliver_edit(embed.message_id)
+                except Exception as ex:
+                    logger.error('Failed to edit Discord message %s. ERROR: %s', embed.message_id, ex)
+                finally:
+                    self.queue.task_done()
+                continue
+            batch = [embed]
+            size = get_embed_size(embed)
+            while len(batch) < self.MAX_EMBEDS:
+                try:
+                    embed = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if embed is STOP or isinstance(embed, MessageEdit) or size + get_embed_size(embed) > self.MAX_EMBEDS_SIZE:
+                    pending = embed
+                    break
+                batch.append(embed)
+                size += get_embed_size(embed)
+            try:
+                self.deliver(batch)
+                for embed in batch:
+                    self.observe_timings(id(embed))
+            except Exception as ex:
+                logger.error('Failed to deliver %s embeds to Discord. ERROR: %s', len(batch), ex)
+            finally:
+                for embed in batch:
+                    self.timings.pop(id(embed), None)
+                    self.queue.task_done()
+
+    def wait_for_rate_limit(self):
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            logger.debug('Waiting %.2fs for the Discord rate limit to reset', delay)
+            time.sleep(delay)
+
+    def update_rate_limit(self, response):
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset_after = float(response.headers.get('X-RateLimit-Reset-After', 1))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_after)
+
+    def get_retry_after(self, response):
+        retry_after = response.headers.get('Retry-After')
+        try:
+            retry_after = response.json().get('retry_after', retry_after)
+        except (ValueError, AttributeError):
+            pass
+        try:
+            return max(float(retry_after), 0)
+        except (TypeError, ValueError):
+            return self.DEFAULT_RETRY_AFTER
+
+    def request(self, method, url, priority=PRIORITY_ANNOUNCE, **kwargs):
+        for attempt in range(self.MAX_RETRIES):
+            self.bucket.acquire(priority)
+            self.wait_for_rate_limit()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                registry.observe_call('discord', method, time.perf_counter() - started, error=True)
+                if attempt == self.MAX_RETRIES - 1:
+                    raise
+                logger.warning('Discord request failed, retrying. ERROR: %s', ex)
+                time.sleep(get_backoff(attempt))
+                continue
+            registry.observe_call('discord', method, time.perf_counter() - started, response.status_code)
+            self.update_rate_limit(response)
+            if response.status_code == 429:
+                retry_after = self.get_retry_after(response)
+                logger.warning('Discord rate limit hit, retrying in %ss', retry_after)
+                self.bucket.penalize(retry_after)
+                continue
+            if response.status_code >= 500:
+                logger.warning('Discord returned %s, retrying', response.status_code)
+                time.sleep(get_backoff(attempt))
+                continue
+            return response
+        raise ValueError(f'Request to webhook failed after {self.MAX_RETRIES} attempts')
+
+    def deliver(self, embeds):
+        response = self.request('POST', self.webhook_url, json={'embeds': embeds})
+        if response.status_code != 204:
+            error_message = f'Request to webhook returned an error {response.status_code},the response is:\n{response.text}'
+            raise ValueError(error_message)
+        logger.debug('%s embeds delivered to Discord', len(embeds))
+
+    def create_message(self, embeds, timings=None):
+        for embed in embeds:
+            embed['color'] = os.getenv("EMBEDS_COLOR")
+        response = self.request('POST', self.webhook_url, PRIORITY_COSMETIC, params={'wait': 'true'},
+                                json={'embeds': embeds})
+        if response.status_code != 200:
+            error_message = f'Request to webhook returned an error {response.status_code},the response is:\n{response.text}'
+            raise ValueError(error_message)
+        message_id = response.json()['id']
+        for started_at, source in timings or ():
+            observe_announcement(started_at, source)
+        logger.debug('Discord message %s created', message_id)
+        return message_id
+
+    def edit_message(self, message_id, embeds, timings=None):
+        for embed in embeds:
+            embed['color'] = os.getenv("EMBEDS_COLOR")
+        with self.edits_lock:
+            already_queued = message_id in self.pending_edits
+            self.pending_edits[message_id] = embeds
+            if timings:
+                self.timings.setdefault(message_id, []).extend(timings)
+        if not already_queued:
+            self.enqueue(MessageEdit(message_id))
+
+    def deliver_edit(self, message_id):
+        with self.edits_lock:
+            embeds = self.pending_edits.pop(message_id, None)
+            timings = self.timings.pop(message_id, ())
+        if embeds is None:
+            return
+        response = self.request('PATCH', f'{self.webhook_url}/messages/{message_id}', PRIORITY_COSMETIC,
+                                json={'embeds': embeds})
+        if response.status_code != 200:
+            error_message = f'Request to webhook returned an error {response.status_code},the response is:\n{response.text}'
+            raise ValueError(error_message)
+        for started_at, source in timings:
+            observe_announcement(started_at, source)
+        logger.debug('Discord message %s edited', message_id)
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        with self.thread_lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.queue.put(STOP)
+                self.thread.join()
+            self.thread = None
+        self.session.close()
+
+
+senders = {}
+senders_lock = threading.Lock()
+
+
+def get_sender(url=None):
+    url = url or webhook_url
+    with senders_lock:
+        if url not in senders:
+            senders[url] = DiscordSender(url)
+        return senders[url]
+
+
+def send_message(message, url=None):
+    get_sender(url).send(message)
+
+
+def flush_messages(url=None):
+    get_sender(url).flush()
+
+
+@atexit.register
+def close_senders():
+    with senders_lock:
+        for sender in senders.values():
+            sender.close()
@@ -0,0 +1,12 @@
+DEFAULT_ELO = 1000
+DEFAULT_CALIBRATION = 10
+K_FACTOR = 50
+CALIBRATION_K_FACTOR = 200
+
+
+def get_k_factor(calibration, k_factor=K_FACTOR, calibration_k_factor=CALIBRATION_K_FACTOR):
+    return calibration_k_factor if calibration > 0 else k_factor
+
+
+def get_expected_score(elo, opponent_elo):
+    return 1 / (1 + pow(10, (opponent_elo - elo) / 400))
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import challonge
+from dotenv import load_dotenv, find_dotenv
+
+from challonge_client import get_client
+from logger import get_logger, set_level
+
+load_dotenv(find_dotenv(), verbose=True, override=True)
+
+logger = get_logger(os.path.basename(__file__))
+
+TOURNAMENT_COLUMNS = ('id', 'name', 'url', 'subdomain', 'tournament_type', 'state', 'game_name',
+                      'participants_count', 'created_at', 'started_at', 'completed_at', 'updated_at')
+PARTICIPANT_COLUMNS = ('id', 'tournament_id', 'name', 'display_name', 'challonge_username', 'seed', 'final_rank',
+                       'active', 'created_at', 'updated_at')
+MATCH_COLUMNS = ('id', 'tournament_id', 'identifier', 'round', 'state', 'suggested_play_order', 'player1_id',
+                 'player2_id', 'winner_id', 'loser_id', 'scores_csv', 'player1_prereq_match_id',
+                 'player2_prereq_match_id', 'player1_is_prereq_match_loser', 'player2_is_prereq_match_loser',
+                 'started_at', 'completed_at', 'updated_at')
+TABLES = {
+    'tournaments': TOURNAMENT_COLUMNS,
+    'participants': PARTICIPANT_COLUMNS,
+    'matches': MATCH_COLUMNS,
+}
+FORMATS = ('csv', 'parquet')
+
+
+def normalize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def normalize_rows(rows, columns):
+    return [{column: normalize_value(row.get(column)) for column in columns} for row in rows]
+
+
+class TournamentExporter:
+    def __init__(self, output_dir, formats=('csv',), workers=8):
+        self.output_dir = output_dir
+        self.formats = formats
+        self.workers = workers
+        self.challonge = get_client()
+        self.manifest_path = os.path.join(output_dir, 'manifest.json')
+        self.manifest_lock = threading.Lock()
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as file:
+                self.manifest = json.load(file)
+        for table in TABLES:
+            for file_format in formats:
+                os.makedirs(os.path.join(output_dir, table, file_format), exist_ok=True)
+        if 'parquet' in formats and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError("Parquet export requires the pyarrow package")
+
+    def is_fresh(self, tournament):
+        return self.manifest.get(str(tournament['id'])) == normalize_value(tournament.get('updated_at'))
+
+    def write_table(self, table, tournament_id, rows):
+        rows = normalize_rows(rows, TABLES[table])
+        for file_format in self.formats:
+            path = os.path.join(self.output_dir, table, file_format, f'{tournament_id}.{file_format}')
+            temporary_path = path + '.tmp'
+            if file_format == 'csv':
+                with open(temporary_path, 'w', newline='', encoding='utf-8') as file:
+                    writer = csv.DictWriter(file, fieldnames=TABLES[table])
+                    writer.writeheader()
+                    writer.writerows(rows)
+            else:
+                import pyarrow
+                import pyarrow.parquet
+
+                columns = {column: [row[column] for row in rows] for column in TABLES[table]}
+                pyarrow.parquet.write_table(pyarrow.table(columns), temporary_path)
+            os.replace(temporary_path, path)
+
+    def save_manifest(self):
+        temporary_path = self.manifest_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self.manifest, file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    def export_tournament(self, tournament):
+        tournament_id = tournament['id']
+        if 'updated_at' not in tournament:
+            tournament = self.challonge.show_tournament(tournament_id)
+            tournament_id = tournament['id']
+            if self.is_fresh(tournament):
+                logger.debug('Tournament %s has not changed, skipping', tournament_id)
+                return False
+        participants, matches = self.challonge.index_participants_with_matches(tournament_id)
+        for result in (participants, matches):
+            if isinstance(result, Exception):
+                raise result
+        self.write_table('tournaments', tournament_id, [tournament])
+        self.write_table('participants', tournament_id, participants)
+        self.write_table('matches', tournament_id, matches)
+        with self.manifest_lock:
+            self.manifest[str(tournament_id)] = normalize_value(tournament.get('updated_at'))
+            self.save_manifest()
+        logger.debug('Tournament %s exported. %s participants, '
+                     '%s matches', tournament_id, len(participants), len(matches))
+        return True
+
+    def export(self, tournaments):
+        exported = skipped = failed = 0
+        window = threading.BoundedSemaphore(self.workers * 2)
+        futures = []
+
+        def release(future):
+            window.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for tournament in tournaments:
+                if 'updated_at' in tournament and self.is_fresh(tournament):
+                    logger.debug('Tournament %s has not changed, skipping', tournament['id'])
+                    skipped += 1
+                    continue
+                window.acquire()
+                future = executor.submit(self.export_tournament, tournament)
+                future.add_done_callback(release)
+                futures.append((tournament['id'], future))
+
+            for tournament_id, future in futures:
+                try:
+                    if future.result():
+                        exported += 1
+                    else:
+                        skipped += 1
+                except Exception as ex:
+                    failed += 1
+                    logger.error('Failed to export tournament %s. ERROR: %s', tournament_id, ex)
+        logger.info('Export finished. Exported - %s. Skipped - %s. Failed - %s', exported, skipped, failed)
+        return exported, skipped, failed
+
+
+def read_partition(output_dir, table, tournament_id):
+    with open(os.path.join(output_dir, table, 'csv', f'{tournament_id}.csv'), newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+def write_history(output_dir, path):
+    tournaments = []
+    for file_name in os.listdir(os.path.join(output_dir, 'tournaments', 'csv')):
+        if file_name.endswith('.csv'):
+            tournaments.extend(read_partition(output_dir, 'tournaments', file_name[:-len('.csv')]))
+    tournaments.sort(key=lambda tournament: tournament['started_at'] or tournament['created_at'])
+
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(('tournament', 'player1', 'player2', 'winner'))
+        for tournament in tournaments:
+            if not tournament['started_at']:
+                continue
+            names = {participant['id']: participant['name']
+                     for participant in read_partition(output_dir, 'participants', tournament['id'])}
+            matches = [match for match in read_partition(output_dir, 'matches', tournament['id'])
+                       if match['state'] == 'complete' and match['winner_id']]
+            matches.sort(key=lambda match: match['completed_at'] or match['updated_at'])
+            for match in matches:
+                if match['player1_id'] not in names or match['player2_id'] not in names:
+                    continue
+                writer.writerow((tournament['id'], names[match['player1_id']], names[match['player2_id']],
+                                 names.get(match['winner_id'])))
+                written += 1
+    logger.info('History written to %s. %s matches from %s tournaments', path, written, len(tournaments))
+
+
+def list_tournaments(args):
+    if args.tournaments:
+        return [{'id': tournament} for tournament in args.tournaments]
+    params = {'state': 'all'}
+    if args.created_after:
+        params['created_after'] = args.created_after
+    if args.created_before:
+        params['created_before'] = args.created_before
+    if args.subdomain:
+        params['subdomain'] = args.subdomain
+    return get_client().index_tournaments(**params)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export Challonge tournaments, participants and matches.')
+
+    parser.add_argument('tournaments', nargs='*', help='Tournament IDs or URLs to export')
+    parser.add_argument('--created-after', type=str, help='Export tournaments created after this date (YYYY-MM-DD)')
+    parser.add_argument('--created-before', type=str, help='Export tournaments created before this date (YYYY-MM-DD)')
+    parser.add_argument('--subdomain', type=str, help='Organization subdomain to list tournaments from')
+    parser.add_argument('--output', type=str, default='exports', help='Output directory')
+    parser.add_argument('--format', choices=FORMATS, action='append', help='Output format, can be repeated')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent fetches')
+    parser.add_argument('--history', type=str,
+                        help='Also write an ordered match history CSV for replay.py (requires csv format)')
+    parser.add_argument('--log-level', type=str.upper, default=os.getenv('LOG_LEVEL', 'DEBUG'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Logging level')
+    args = parser.parse_args()
+    set_level(args.log_level)
+
+    formats = tuple(args.format or ('csv',))
+    challonge.set_credentials(os.getenv('CHALLONGE_LOGIN'), os.getenv('CHALLONGE_API_KEY'))
+    exporter = TournamentExporter(args.output, formats, args.workers)
+    if args.tournaments or args.created_after or args.created_before or args.subdomain:
+        exporter.export(list_tournaments(args))
+    if args.history:
+        if 'csv' not in formats:
+            parser.error("--history requires the csv format")
+        write_history(args.output, args.history)
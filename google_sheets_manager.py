@@ -1,89 +1,358 @@
 import os.path
+import re
+import threading
+import time
 
 from dotenv import load_dotenv, find_dotenv
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from logger import get_logger
+from metrics import track_call
+from quota import call_with_quota, PRIORITY_POLL, PRIORITY_RATINGS
 
 load_dotenv(find_dotenv(), verbose=True, override=True)
 
 logger = get_logger(os.path.basename(__file__))
 
+RANGE_ROW_PATTERN = re.compile(r'^(?:.*!)?[A-Z]+(\d+)')
+RANGE_COLUMNS_PATTERN = re.compile(r'^([A-Z]+)\d*(?::([A-Z]+)\d*)?$')
 
-class GoogleSheetsManager:
-    SCOPES = [os.getenv('SCOPES')]
 
-    def __init__(self, spreadsheet_id, default_range_name):
-        self.spreadsheet_id = spreadsheet_id
-        self.default_range_name = default_range_name
-        self.sheet = None
-        self.service = None
+connection = {'credentials': None, 'service': None, 'drive': None}
+connection_lock = threading.Lock()
+thread_http = threading.local()
+
+
+def get_connection(scopes):
+    with connection_lock:
+        if connection['service'] is not None:
+            return connection['credentials'], connection['service']
+
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build
 
         service_account_files = [os.getenv('SHEET_SERVICE_ACCOUNT_FILE'),
                                  os.getenv('SHEET_SERVICE_ACCOUNT_FILE_RESERVE')]
 
         for file in service_account_files:
             try:
-                logger.debug(f"Attempting connection with {file}")
+                logger.debug("Attempting connection with %s", file)
                 creds = Credentials.from_service_account_file(file,
-                                                              scopes=self.SCOPES)
-                self.service = build('sheets', 'v4', credentials=creds)
-                self.sheet = self.service.spreadsheets()
+                                                              scopes=scopes)
+                connection['service'] = build('sheets', 'v4', credentials=creds, static_discovery=True,
+                                              cache_discovery=False)
+                connection['credentials'] = creds
                 logger.debug("Connection to Google Sheets was successful")
                 break
-            except HttpError as error:
-                logger.error(f'An error occurred with {file}: {error}')
+            except (HttpError, OSError, ValueError) as error:
+                logger.error('An error occurred with %s: %s', file, error)
                 continue
 
-        if self.service is None:
+        if connection['service'] is None:
             logger.critical("Failed to connect to any service account")
+        return connection['credentials'], connection['service']
+
+
+def get_drive_service(credentials):
+    with connection_lock:
+        if connection['drive'] is None:
+            from googleapiclient.discovery import build
+
+            connection['drive'] = build('drive', 'v3', credentials=credentials, static_discovery=True,
+                                        cache_discovery=False)
+        return connection['drive']
+
+
+def follows_revision(previous, revision, writes=1):
+    try:
+        return int(revision) == int(previous) + writes
+    except (TypeError, ValueError):
+        return False
+
+
+def get_authorized_http(credentials):
+    http = getattr(thread_http, 'http', None)
+    if http is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        http = AuthorizedHttp(credentials, http=httplib2.Http())
+        thread_http.http = http
+    return http
+
+
+class GoogleSheetsManager:
+    SCOPES = (os.getenv('SCOPES') or '').replace(',', ' ').split()
+    CHUNK_ROWS = int(os.getenv('SHEET_CHUNK_ROWS', 1000))
+    REVISION_CHECK = os.getenv('SHEET_REVISION_CHECK', 'true').lower() == 'true'
+    MAX_PENDING_UPDATES = int(os.getenv('SHEET_MAX_PENDING_UPDATES', 50))
+    FLUSH_INTERVAL = float(os.getenv('SHEET_FLUSH_INTERVAL', 10))
+
+    def __init__(self, spreadsheet_id, default_range_name):
+        self.spreadsheet_id = spreadsheet_id
+        self.default_range_name = default_range_name
+        self.sheet_list, _, cells = default_range_name.rpartition('!')
+        match = RANGE_ROW_PATTERN.match(cells)
+        self.first_row = int(match.group(1)) if match else 1
+        match = RANGE_COLUMNS_PATTERN.match(cells)
+        self.first_column, self.last_column = (match.group(1), match.group(2) or match.group(1)) if match else ('A', 'F')
+        self.revision_check = self.REVISION_CHECK
+        self.user_rows = None
+        self.rows_revision = None
+        self.write_count = 0
+        self.pending_updates = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+        self.credentials = None
+        self.service = None
+        self.spreadsheets = None
+
+    def connect(self):
+        if self.spreadsheets is None:
+            self.credentials, self.service = get_connection(self.SCOPES)
+            if self.service is None:
+                raise ConnectionError("Google Sheets service is not available")
+            self.spreadsheets = self.service.spreadsheets()
+
+    @property
+    def sheet(self):
+        self.connect()
+        return self.spreadsheets
+
+    @property
+    def drive(self):
+        self.connect()
+        return get_drive_service(self.credentials)
+
+    def execute(self, request, priority=None):
+        operation = getattr(request, 'methodId', 'request')
+        if operation.startswith('drive.'):
+            service = 'drive'
+        else:
+            service = 'sheets.read' if operation.endswith(('.get', '.batchGet')) else 'sheets.write'
+        if priority is None:
+            priority = PRIORITY_RATINGS if service == 'sheets.write' else PRIORITY_POLL
+
+        def tracked_request():
+            with track_call('sheets', operation):
+                return request.execute(http=get_authorized_http(self.credentials))
+
+        result = call_with_quota(service, tracked_request, priority=priority)
+        if service == 'sheets.write':
+            self.write_count += 1
+            self.advance_rows_revision()
+        return result
+
+    def advance_rows_revision(self):
+        if self.rows_revision is None:
+            return
+        try:
+            revision = self.get_revision()
+        except Exception as ex:
+            logger.warning('Failed to read the sheet revision after a write. ERROR: %s', ex)
+            revision = None
+        self.rows_revision = revision if follows_revision(self.rows_revision, revision) else None
 
     def write_data(self, range_name, values):
         body = {
             'values': [values]
         }
-        result = self.sheet.values().update(
+        result = self.execute(self.sheet.values().update(
             spreadsheetId=self.spreadsheet_id, range=range_name,
-            valueInputOption='USER_ENTERED', body=body).execute()
-        logger.debug(f'Writing data. Range - {range_name}. {result.get("updatedCells")} cells updated')
+            valueInputOption='USER_ENTERED', body=body))
+        logger.debug('Writing data. Range - %s. %s cells updated', range_name, result.get('updatedCells'))
 
     def append_to_last_empty_row(self, range_name, values):
         body = {
             'values': values
         }
-        self.sheet.values().append(
+        result = self.execute(self.sheet.values().append(
             spreadsheetId=self.spreadsheet_id, range=range_name,
-            valueInputOption='USER_ENTERED', insertDataOption='OVERWRITE', body=body).execute()
+            valueInputOption='USER_ENTERED', insertDataOption='OVERWRITE', body=body))
         logger.debug("New row has been added to the table")
+        return result
 
     def get_users_data(self):
-        logger.debug("Getting user data")
-        result = self.sheet.values().get(spreadsheetId=self.spreadsheet_id, range=self.default_range_name).execute()
-        values = result.get('values', [])
-        if not values:
-            logger.debug("No data found")
-        else:
-            logger.debug("Data received successfully ")
-            return values
+        with self.lock:
+            logger.debug("Getting user data")
+            result = self.execute(self.sheet.values().get(spreadsheetId=self.spreadsheet_id,
+                                                          range=self.default_range_name))
+            values = result.get('values', [])
+            if not values:
+                logger.debug("No data found")
+            else:
+                logger.debug("Data received successfully ")
+            self.index_user_rows(values)
+            return values or None
+
+    def get_revision(self):
+        if not self.revision_check:
+            return None
+        try:
+            result = self.execute(self.drive.files().get(fileId=self.spreadsheet_id, fields='version'))
+        except HttpError as ex:
+            logger.warning('Spreadsheet revision is not available, falling back to chunked reads. ERROR: %s', ex)
+            self.revision_check = False
+            return None
+        return result.get('version')
+
+    def iter_user_rows(self):
+        first_row = self.first_row
+        while True:
+            last_row = first_row + self.CHUNK_ROWS - 1
+            range_name = f"{self.sheet_list}!{self.first_column}{first_row}:{self.last_column}{last_row}"
+            result = self.execute(self.sheet.values().get(spreadsheetId=self.spreadsheet_id, range=range_name))
+            values = result.get('values', [])
+            for offset, row in enumerate(values):
+                yield first_row + offset, row
+            if len(values) < self.CHUNK_ROWS:
+                logger.debug('Roster read finished at row %s', first_row + len(values) - 1)
+                return
+            first_row = last_row + 1
+
+    def set_user_rows(self, user_rows, revision=None):
+        with self.lock:
+            self.user_rows = dict(user_rows)
+            self.rows_revision = revision
+            logger.debug('Row index restored. %s users indexed', len(self.user_rows))
+
+    def index_user_rows(self, values):
+        self.user_rows = {}
+        self.rows_revision = None
+        for offset, row in enumerate(values):
+            if row and row[0] not in self.user_rows:
+                self.user_rows[row[0]] = self.first_row + offset
+        logger.debug('Row index rebuilt. %s users indexed', len(self.user_rows))
+
+    def invalidate_user_rows(self):
+        logger.debug("Row index invalidated")
+        self.user_rows = None
+        self.rows_revision = None
+
+    def get_user_row(self, username):
+        with self.lock:
+            if self.user_rows is None or username not in self.user_rows:
+                logger.debug('Row for %s is not cached, reloading the row index', username)
+                self.get_users_data()
+            return self.user_rows.get(username)
+
+    def find_moved_rows(self, user_rows):
+        ranges = [f"{self.sheet_list}!{self.first_column}{row}" for row in user_rows.values()]
+        result = self.execute(self.sheet.values().batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges))
+        moved = []
+        for username, value_range in zip(user_rows, result.get('valueRanges', [])):
+            values = value_range.get('values') or [[]]
+            if not values[0] or values[0][0] != username:
+                moved.append(username)
+        return moved
+
+    def get_verified_rows(self, usernames):
+        with self.lock:
+            revision = self.get_revision()
+            user_rows = {}
+            for username in usernames:
+                row = self.get_user_row(username)
+                if row is not None:
+                    user_rows[username] = row
+            if revision is not None and revision == self.rows_revision:
+                logger.debug('Sheet revision %s is unchanged, skipping the row check', revision)
+                return user_rows
+            if user_rows and self.find_moved_rows(user_rows):
+                logger.warning('Sheet rows have moved since they were indexed, rebuilding the row index')
+                self.get_users_data()
+                user_rows = {username: self.user_rows[username] for username in usernames
+                             if username in self.user_rows}
+            self.rows_revision = revision
+            return user_rows
 
     def add_new_user(self, user):
-        logger.debug("Adding a new user")
-        self.append_to_last_empty_row(self.default_range_name, [
-            [user.username, user.elo, user.calibration, user.matches_played, user.matches_won, user.tournaments_played],
-        ])
-        logger.debug("User added successfully")
+        self.add_new_users([user])
+
+    def add_new_users(self, users):
+        if not users:
+            return
+        with self.lock:
+            logger.debug('Adding %s new users', len(users))
+            result = self.append_to_last_empty_row(self.default_range_name, [
+                [user.username, user.elo, user.calibration, user.matches_played, user.matches_won, user.tournaments_played]
+                for user in users
+            ])
+            updated_range = result.get('updates', {}).get('updatedRange', '')
+            match = RANGE_ROW_PATTERN.match(updated_range)
+            if match and self.user_rows is not None:
+                first_row = int(match.group(1))
+                for offset, user in enumerate(users):
+                    self.user_rows[user.username] = first_row + offset
+            else:
+                self.invalidate_user_rows()
+            logger.debug("Users added successfully")
+
+    def batch_write_data(self, data):
+        body = {
+            'valueInputOption': 'USER_ENTERED',
+            'data': data
+        }
+        result = self.execute(self.sheet.values().batchUpdate(spreadsheetId=self.spreadsheet_id, body=body))
+        logger.debug('Batch writing data. %s ranges, %s cells updated', len(data), result.get('totalUpdatedCells'))
+
+    def queue_user_update(self, user):
+        with self.lock:
+            logger.debug('Queueing update for %s. New ELO - %s', user.username, user.elo)
+            self.pending_updates[user.username] = user
+            if len(self.pending_updates) >= self.MAX_PENDING_UPDATES or \
+                    time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL:
+                self.flush_updates()
+
+    def flush_updates(self):
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.pending_updates:
+                return
+            pending = self.pending_updates
+            self.pending_updates = {}
+            data = []
+            try:
+                user_rows = self.get_verified_rows(pending)
+            except Exception:
+                self.requeue_updates(pending)
+                raise
+            for user in pending.values():
+                row = user_rows.get(user.username)
+                if row is None:
+                    logger.error('User %s was not found in the sheet', user.username)
+                    continue
+                data.append({
+                    'range': f"{self.sheet_list}!B{row}:F{row}",
+                    'values': [[user.elo, user.calibration, user.matches_played, user.matches_won,
+                                user.tournaments_played]]
+                })
+            if not data:
+                return
+            try:
+                self.batch_write_data(data)
+            except Exception:
+                self.invalidate_user_rows()
+                self.requeue_updates(pending)
+                raise
+            logger.debug('Flushed %s pending user updates', len(data))
+
+    def requeue_updates(self, pending):
+        for username, user in pending.items():
+            self.pending_updates.setdefault(username, user)
+        logger.debug('%s user updates returned to the queue', len(pending))
 
     def update_user_by_username(self, user):
-        logger.debug(f'Updating ELO for {user.username}. New ELO - {user.elo}')
-        values = self.get_users_data()
-        len = 2
-        for row in values:
-            if row[0] == user.username:
-                break
-            len += 1
-        self.write_data(f"{os.getenv('SHEET_LIST')}!B{len}:F{len}", [user.elo, user.calibration,
+        with self.lock:
+            logger.debug('Updating ELO for %s. New ELO - %s', user.username, user.elo)
+            row = self.get_verified_rows([user.username]).get(user.username)
+            if row is None:
+                logger.error('User %s was not found in the sheet', user.username)
+                return
+            try:
+                self.write_data(f"{self.sheet_list}!B{row}:F{row}", [user.elo, user.calibration,
                                                                      user.matches_played, user.matches_won,
                                                                      user.tournaments_played])
-        logger.debug(f'ELO has been successfully changed. Row number - {len}')
+            except HttpError:
+                self.invalidate_user_rows()
+                raise
+            logger.debug('ELO has been successfully changed. Row number - %s', row)
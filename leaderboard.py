@@ -0,0 +1,50 @@
+import argparse
+import csv
+import os
+
+from dotenv import load_dotenv, find_dotenv
+
+from logger import get_logger, set_level
+from ratings_store import RatingsStore
+from users import UserRegistry
+
+load_dotenv(find_dotenv(), verbose=True, override=True)
+
+logger = get_logger(os.path.basename(__file__))
+
+LEADERBOARD_FIELDS = ('rank', 'username', 'elo', 'calibration', 'matches_played', 'matches_won', 'tournaments_played')
+
+
+def load_leaderboard(sheet_list):
+    store = RatingsStore(sheet_list)
+    try:
+        registry = UserRegistry()
+        registry.add_many(store.load_users())
+    finally:
+        store.close()
+    return registry
+
+
+def write_leaderboard(path, registry, top=None):
+    users = registry.get_top(top or len(registry))
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(LEADERBOARD_FIELDS)
+        for user in users:
+            writer.writerow([registry.get_rank(user)] + [getattr(user, field) for field in LEADERBOARD_FIELDS[1:]])
+    return len(users)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the rating ladder from the local ratings store.')
+
+    parser.add_argument('--sheet-list', type=str, default=os.getenv('SHEET_LIST'), help='Ladder (sheet list) to export')
+    parser.add_argument('--output', type=str, default='leaderboard.csv', help='Where to write the leaderboard')
+    parser.add_argument('--top', type=int, help='Only export the top N players')
+    parser.add_argument('--log-level', type=str.upper, default=os.getenv('LOG_LEVEL', 'DEBUG'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Logging level')
+    args = parser.parse_args()
+    set_level(args.log_level)
+
+    written = write_leaderboard(args.output, load_leaderboard(args.sheet_list), args.top)
+    logger.info('Leaderboard written to %s. %s players', args.output, written)
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import deque
+
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+MAX_DESCRIPTION_LENGTH = 4096
+
+
+def truncate(text):
+    if len(text) <= MAX_DESCRIPTION_LENGTH:
+        return text
+    return text[:MAX_DESCRIPTION_LENGTH - 1] + "…"
+
+
+class LiveScoreboard:
+    DEBOUNCE_INTERVAL = float(os.getenv('SCOREBOARD_DEBOUNCE_INTERVAL', 5))
+    RECENT_RESULTS = 10
+
+    def __init__(self, sender, debounce_interval=DEBOUNCE_INTERVAL):
+        self.sender = sender
+        self.debounce_interval = debounce_interval
+        self.message_id = None
+        self.title = "📋 Live standings"
+        self.standings = ""
+        self.projection = ""
+        self.open_matches = {}
+        self.finished_matches = deque(maxlen=self.RECENT_RESULTS)
+        self.dirty = False
+        self.last_publish = 0
+        self.timings = []
+        self.lock = threading.RLock()
+        self.flush_timer = None
+
+    def set_standings(self, standings, title=None):
+        with self.lock:
+            self.standings = standings
+            if title is not None:
+                self.title = title
+            self.dirty = True
+
+    def set_projection(self, projection):
+        with self.lock:
+            self.projection = projection
+            self.dirty = True
+
+    def match_opened(self, match_id, description):
+        with self.lock:
+            self.open_matches[match_id] = description
+            self.dirty = True
+
+    def match_finished(self, match_id, description, timings=None):
+        with self.lock:
+            self.open_matches.pop(match_id, None)
+            self.timings.extend(timings or ())
+            self.finished_matches.appendleft(description)
+            self.dirty = True
+
+    def build_embeds(self):
+        embeds = [{
+            "title": self.title,
+            "description": truncate(self.standings or "-"),
+        }]
+        if self.projection:
+            embeds.append({
+                "title": "🔮 Projection",
+                "description": truncate(self.projection),
+            })
+        if self.open_matches:
+            embeds.append({
+                "title": "🏆 Current matches",
+                "description": truncate("\n".join(self.open_matches.values())),
+            })
+        if self.finished_matches:
+            embeds.append({
+                "title": "🏁 Finished matches",
+                "description": truncate("\n".join(self.finished_matches)),
+            })
+        return embeds
+
+    def publish(self, force=False):
+        with self.lock:
+            if not self.dirty:
+                return
+            delay = self.last_publish + self.debounce_interval - time.monotonic()
+            if not force and delay > 0:
+                logger.debug("Scoreboard update postponed by debounce for %.2fs", delay)
+                self.schedule_flush(delay)
+                return
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            self.dirty = False
+            self.last_publish = time.monotonic()
+            timings, self.timings = self.timings, []
+            if self.message_id is None:
+                self.message_id = self.sender.create_message(self.build_embeds(), timings)
+            else:
+                self.sender.edit_message(self.message_id, self.build_embeds(), timings)
+            logger.debug('Scoreboard message %s updated', self.message_id)
+
+    def schedule_flush(self, delay):
+        if self.flush_timer is None:
+            self.flush_timer = threading.Timer(delay, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.flush_timer = None
+            try:
+                self.publish()
+            except Exception as ex:
+                logger.error('Failed to publish the postponed scoreboard update. ERROR: %s', ex)
@@ -1,34 +1,100 @@
+import atexit
+import json
 import logging
 import os
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+import threading
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv(), verbose=True, override=True)
 
 LOG_DIR = 'logs'
 LOG_FILE_PATH = os.path.join(LOG_DIR, 'application.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
 time_format = "%Y-%m-%d %H:%M:%S"
 FORMATTER = logging.Formatter(fmt='%(asctime)s — %(name)s — %(lineno)d — %(levelname)s — %(message)s', datefmt=time_format)
 
+log_queue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+listener = None
+listener_lock = threading.Lock()
+loggers = {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, time_format),
+            'name': record.name,
+            'line': record.lineno,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def get_formatter():
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return FORMATTER
+
 
 def get_console_handler():
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(FORMATTER)
+    console_handler.setFormatter(get_formatter())
     return console_handler
 
 
 def get_file_handler():
-    file_handler = TimedRotatingFileHandler(LOG_FILE_PATH, when='midnight')
-    file_handler.setFormatter(FORMATTER)
+    file_handler = TimedRotatingFileHandler(LOG_FILE_PATH, when='midnight', encoding='utf-8')
+    file_handler.setFormatter(get_formatter())
     return file_handler
 
 
+def start_listener():
+    global listener
+    with listener_lock:
+        if listener is None:
+            listener = QueueListener(log_queue, get_console_handler(), get_file_handler(),
+                                     respect_handler_level=True)
+            listener.start()
+            atexit.register(stop_listener)
+
+
+def stop_listener():
+    global listener
+    with listener_lock:
+        if listener is not None:
+            listener.stop()
+            listener = None
+
+
+def set_level(log_level):
+    global LOG_LEVEL
+    LOG_LEVEL = str(log_level).upper()
+    for logger in loggers.values():
+        logger.setLevel(LOG_LEVEL)
+
+
 def get_logger(logger_name):
+    logger = loggers.get(logger_name)
+    if logger is not None:
+        return logger
+    start_listener()
     logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
-    logger.addHandler(get_console_handler())
-    logger.addHandler(get_file_handler())
+    logger.setLevel(LOG_LEVEL)
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
     logger.propagate = False
+    loggers[logger_name] = logger
     return logger
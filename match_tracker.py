@@ -0,0 +1,37 @@
+import os
+import time
+
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+
+class MatchTracker:
+    FULL_RESCAN_INTERVAL = float(os.getenv('FULL_RESCAN_INTERVAL', 60))
+
+    def __init__(self):
+        self.match_versions = {}
+        self.tournament_updated_at = None
+        self.last_full_rescan = time.monotonic()
+
+    def tournament_changed(self, tournament):
+        updated_at = tournament.get('updated_at')
+        if updated_at is None or updated_at != self.tournament_updated_at:
+            return True
+        if time.monotonic() - self.last_full_rescan >= self.FULL_RESCAN_INTERVAL:
+            logger.debug("Tournament has not changed, running a periodic full rescan")
+            return True
+        return False
+
+    def mark_tournament_seen(self, tournament):
+        self.tournament_updated_at = tournament.get('updated_at')
+        self.last_full_rescan = time.monotonic()
+
+    def changed_matches(self, matches):
+        changed = [match for match in matches
+                   if self.match_versions.get(match['id']) != (match.get('updated_at'), match['state'])]
+        logger.debug('%s of %s matches changed since the last poll', len(changed), len(matches))
+        return changed
+
+    def mark_match_seen(self, match):
+        self.match_versions[match['id']] = (match.get('updated_at'), match['state'])
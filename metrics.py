@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from checkpoint import DATA_DIR
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_DIR = os.path.join(DATA_DIR, 'metrics')
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def get_status(ex):
+    response = getattr(ex, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(ex, 'resp', None), 'status', None)
+    return int(status) if status is not None else None
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.max = self.max
+        return histogram
+
+    def subtract(self, previous):
+        histogram = Histogram(self.buckets)
+        histogram.counts = [count - previous_count for count, previous_count in zip(self.counts, previous.counts)]
+        histogram.count = self.count - previous.count
+        histogram.sum = self.sum - previous.sum
+        if self.max > previous.max:
+            histogram.max = self.max
+        elif histogram.count:
+            histogram.max = min([bound for bound, count in zip(self.buckets, histogram.counts)
+                                 if count >= histogram.count] + [self.max])
+        return histogram
+
+    def get_quantile(self, quantile):
+        if not self.count:
+            return 0
+        target = quantile * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def increment(self, name, labels=(), value=1):
+        with self.lock:
+            key = (name, tuple(labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        with self.lock:
+            key = (name, tuple(labels))
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def observe_call(self, service, operation, seconds, status=None, error=False):
+        labels = (('service', service), ('operation', operation))
+        self.increment('external_calls_total', labels)
+        self.observe('external_call_duration_seconds', seconds, labels)
+        if status == 429:
+            self.increment('external_call_rate_limited_total', labels)
+        if error or (status is not None and status >= 400):
+            self.increment('external_call_errors_total', labels)
+
+    def get_counter(self, name, labels=()):
+        with self.lock:
+            return self.counters.get((name, tuple(labels)), 0)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name in sorted({key[0] for key in self.counters}):
+                lines.append(f'# TYPE {name} counter')
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+            for name in sorted({key[0] for key in self.histograms}):
+                lines.append(f'# TYPE {name} histogram')
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {count}')
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started': time.time(),
+                'counters': dict(self.counters),
+                'histograms': {key: histogram.copy() for key, histogram in self.histograms.items()},
+            }
+
+    def get_summary(self, since=None):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: histogram.copy() for key, histogram in self.histograms.items()}
+        started = self.started
+        if since is not None:
+            started = since['started']
+            counters = {key: value - since['counters'].get(key, 0) for key, value in counters.items()}
+            histograms = {key: histogram.subtract(since['histograms'][key]) if key in since['histograms']
+                          else histogram for key, histogram in histograms.items()}
+        summary = {'uptime': round(time.time() - started, 3), 'calls': [], 'latency': []}
+        for (name, labels), histogram in sorted(histograms.items()):
+            if not histogram.count:
+                continue
+            entry = dict(labels)
+            entry.update({
+                'count': histogram.count,
+                'mean': round(histogram.sum / histogram.count, 4),
+                'p50': histogram.get_quantile(0.5),
+                'p95': histogram.get_quantile(0.95),
+                'max': round(histogram.max, 4),
+            })
+            if name == 'external_call_duration_seconds':
+                entry['error_rate'] = round(
+                    counters.get(('external_call_errors_total', labels), 0) / histogram.count, 4)
+                entry['rate_limited_rate'] = round(
+                    counters.get(('external_call_rate_limited_total', labels), 0) / histogram.count, 4)
+                summary['calls'].append(entry)
+            else:
+                entry['metric'] = name
+                summary['latency'].append(entry)
+        return summary
+
+    def write_summary(self, name, since=None):
+        summary = self.get_summary(since)
+        for entry in summary['calls']:
+            logger.info('%s %s: %s calls, mean %.3fs, p95 <= %ss, max %.3fs, errors %.1f%%, 429 %.1f%%',
+                        entry['service'], entry['operation'], entry['count'], entry['mean'], entry['p95'],
+                        entry['max'], entry['error_rate'] * 100, entry['rate_limited_rate'] * 100)
+        for entry in summary['latency']:
+            logger.info('%s %s: %s samples, mean %.3fs, p95 <= %ss, max %.3fs', entry['metric'],
+                        entry.get('source', ''), entry['count'], entry['mean'], entry['p95'], entry['max'])
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        safe_name = ''.join(char if char.isalnum() or char in '-_' else '_' for char in str(name))
+        path = os.path.join(METRICS_DIR, f'{safe_name}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+        logger.debug('Metrics summary written to %s', path)
+        return path
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def track_call(service, operation):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as ex:
+        registry.observe_call(service, operation, time.perf_counter() - started, get_status(ex), error=True)
+        raise
+    registry.observe_call(service, operation, time.perf_counter() - started)
+
+
+def observe_announcement(started_at, source):
+    registry.observe('match_announcement_latency_seconds', max(0, time.time() - started_at),
+                     (('source', source),))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+server = None
+server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    global server
+    with server_lock:
+        if server is not None or not port:
+            return server
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.debug('Metrics endpoint listening on http://%s:%s/metrics', host, port)
+        return server
@@ -0,0 +1,43 @@
+import os
+import threading
+
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+
+class PollScheduler:
+    def __init__(self, min_interval=float(os.getenv('POLL_MIN_INTERVAL', 1)),
+                 max_interval=float(os.getenv('POLL_MAX_INTERVAL', 30)), backoff=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.stop_event = threading.Event()
+
+    @property
+    def active(self):
+        return self.interval <= self.min_interval
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def activity(self):
+        self.interval = self.min_interval
+        logger.debug('Activity detected, polling every %ss', self.interval)
+
+    def idle(self):
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+        logger.debug('Nothing changed, polling every %ss', self.interval)
+
+    def rate_limited(self, retry_after=None):
+        backoff_interval = min(self.interval * self.backoff, self.max_interval)
+        self.interval = max(retry_after or 0, backoff_interval)
+        logger.warning('Rate limited by the API, next poll in %ss', self.interval)
+
+    def sleep(self):
+        self.stop_event.wait(self.interval)
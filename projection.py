@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from elo import K_FACTOR, CALIBRATION_K_FACTOR
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+SIMULATIONS = int(os.getenv('PROJECTION_SIMULATIONS', 10000))
+WORKERS = int(os.getenv('PROJECTION_WORKERS', os.cpu_count() or 1))
+CHUNK_SIZE = 10000
+START_METHOD = os.getenv('PROJECTION_START_METHOD',
+                         'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+executor = None
+
+
+class Bracket:
+    def __init__(self, matches, players):
+        self.player_ids = [player.id for player in players]
+        self.elo = np.array([player.elo for player in players], dtype=np.int64)
+        self.calibration = np.array([player.calibration for player in players], dtype=np.int64)
+        index = {player_id: position for position, player_id in enumerate(self.player_ids)}
+        by_id = {match['id']: match for match in matches}
+
+        routed = set()
+        for match in matches:
+            for side in ('player1', 'player2'):
+                prereq = match.get(f'{side}_prereq_match_id')
+                if prereq in by_id:
+                    routed.add((prereq, bool(match.get(f'{side}_is_prereq_match_loser'))))
+
+        order = []
+        depth = {}
+        visiting = set()
+
+        def visit(match_id):
+            if match_id in depth:
+                return depth[match_id]
+            if match_id in visiting:
+                raise ValueError(f'Bracket has a cycle at match {match_id}')
+            visiting.add(match_id)
+            match = by_id[match_id]
+            level = 0
+            for side in ('player1', 'player2'):
+                prereq = match.get(f'{side}_prereq_match_id')
+                if prereq in by_id:
+                    level = max(level, visit(prereq) + 1)
+            visiting.discard(match_id)
+            depth[match_id] = level
+            order.append(match_id)
+            return level
+
+        for match in sorted(matches, key=lambda item: item['id']):
+            visit(match['id'])
+
+        self.max_depth = max(depth.values(), default=0) + 1
+        self.matches = []
+        positions = {match_id: position for position, match_id in enumerate(order)}
+        for match_id in order:
+            match = by_id[match_id]
+            sides = []
+            for side in ('player1', 'player2'):
+                prereq = match.get(f'{side}_prereq_match_id')
+                player = index.get(match.get(f'{side}_id'), -1)
+                if player == -1 and prereq in positions:
+                    sides.append((None, positions[prereq], bool(match.get(f'{side}_is_prereq_match_loser'))))
+                else:
+                    sides.append((player, None, False))
+            prereq1 = match.get('player1_prereq_match_id')
+            self.matches.append({
+                'sides': sides,
+                'depth': depth[match_id],
+                'state': match['state'],
+                'winner': index.get(match.get('winner_id'), -1),
+                'reset_of': positions[prereq1] if prereq1 in positions and
+                prereq1 == match.get('player2_prereq_match_id') else None,
+                'winner_routed': (match_id, False) in routed,
+                'loser_routed': (match_id, True) in routed,
+            })
+
+
+def simulate(bracket, simulations, seed, k_factor=K_FACTOR, calibration_k_factor=CALIBRATION_K_FACTOR):
+    random = np.random.default_rng(seed)
+    players_count = len(bracket.player_ids)
+    rows = np.arange(simulations)
+    elo = np.tile(bracket.elo, (simulations, 1))
+    calibration = np.tile(bracket.calibration, (simulations, 1))
+    elimination = np.zeros((simulations, players_count), dtype=np.int64)
+    winners = []
+    losers = []
+    first_players = []
+
+    for match in bracket.matches:
+        players = []
+        for player, prereq, is_loser in match['sides']:
+            if prereq is None:
+                players.append(np.full(simulations, player))
+            else:
+                players.append(losers[prereq] if is_loser else winners[prereq])
+        first, second = players
+        active = (first >= 0) & (second >= 0)
+        if match['reset_of'] is not None:
+            active &= winners[match['reset_of']] != first_players[match['reset_of']]
+
+        if match['state'] == 'complete' and match['winner'] >= 0:
+            first_won = first == match['winner']
+        else:
+            safe_first = np.where(first >= 0, first, 0)
+            safe_second = np.where(second >= 0, second, 0)
+            first_elo = elo[rows, safe_first]
+            second_elo = elo[rows, safe_second]
+            first_expected = 1 / (1 + np.power(10.0, (second_elo - first_elo) / 400))
+            first_won = random.random(simulations) < first_expected
+
+            first_calibration = calibration[rows, safe_first]
+            second_calibration = calibration[rows, safe_second]
+            if match['state'] != 'open':
+                first_calibration = first_calibration - (first_calibration > 0)
+                second_calibration = second_calibration - (second_calibration > 0)
+            first_k = np.where(first_calibration > 0, calibration_k_factor, k_factor)
+            second_k = np.where(second_calibration > 0, calibration_k_factor, k_factor)
+            first_delta = np.trunc(first_k * (first_won - first_expected)).astype(np.int64)
+            second_delta = np.trunc(second_k * ((1 - first_won) - (1 - first_expected))).astype(np.int64)
+
+            changed = rows[active]
+            elo[changed, safe_first[active]] += first_delta[active]
+            elo[changed, safe_second[active]] += second_delta[active]
+            calibration[changed, safe_first[active]] = first_calibration[active]
+            calibration[changed, safe_second[active]] = second_calibration[active]
+
+        winner = np.where(active, np.where(first_won, first, second), np.where(first >= 0, first, second))
+        loser = np.where(active, np.where(first_won, second, first), -1)
+        if not match['loser_routed']:
+            eliminated = rows[loser >= 0]
+            elimination[eliminated, loser[loser >= 0]] = match['depth'] + 1
+        if not match['winner_routed']:
+            crowned = rows[winner >= 0]
+            elimination[crowned, winner[winner >= 0]] = bracket.max_depth + 1
+        winners.append(winner)
+        losers.append(loser)
+        first_players.append(first)
+
+    keys = (rows[:, None] * (bracket.max_depth + 2) + elimination).ravel()
+    not_above = np.searchsorted(np.sort(keys), keys, side='right') - np.repeat(rows, players_count) * players_count
+    placement = (players_count - not_above + 1).reshape(simulations, players_count)
+
+    placement_counts = np.zeros((players_count, players_count + 1), dtype=np.int64)
+    np.add.at(placement_counts, (np.tile(np.arange(players_count), simulations), placement.ravel()), 1)
+    return elo.sum(axis=0), placement_counts
+
+
+def simulate_chunks(bracket, simulations, seed):
+    elo_sum = np.zeros(len(bracket.player_ids), dtype=np.int64)
+    placement_counts = np.zeros((len(bracket.player_ids), len(bracket.player_ids) + 1), dtype=np.int64)
+    for offset in range(0, simulations, CHUNK_SIZE):
+        chunk_elo, chunk_placements = simulate(bracket, min(CHUNK_SIZE, simulations - offset), seed + offset)
+        elo_sum += chunk_elo
+        placement_counts += chunk_placements
+    return elo_sum, placement_counts
+
+
+def get_executor():
+    global executor
+    if executor is None and WORKERS > 1:
+        executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+    return executor
+
+
+class Projection:
+    def __init__(self, players, expected_elo, placement_counts, simulations):
+        self.players = players
+        self.expected_elo = expected_elo
+        self.placement_probabilities = placement_counts / simulations
+        self.simulations = simulations
+
+    def title_odds(self, position):
+        return self.placement_probabilities[position, 1]
+
+    def expected_placement(self, position):
+        return float((self.placement_probabilities[position] * np.arange(len(self.players) + 1)).sum())
+
+    def get_summary(self, limit=10):
+        positions = sorted(range(len(self.players)), key=lambda position: (-self.title_odds(position),
+                                                                              self.expected_placement(position)))
+        lines = []
+        for position in positions[:limit]:
+            player = self.players[position]
+            expected = self.expected_elo[position]
+            lines.append(f"{player.username}: 🏆 {self.title_odds(position):.1%} · avg #{self.expected_placement(position):.1f}"
+                         f" · {expected:.0f} TRP ({expected - player.elo:+.0f})")
+        return "\n".join(lines)
+
+
+def project_tournament(matches, players, simulations=SIMULATIONS, seed=None):
+    players = list(players)
+    if not players or not matches or simulations <= 0:
+        return None
+    bracket = Bracket(matches, players)
+    seed = int(np.random.SeedSequence(seed).generate_state(1)[0]) if seed is None else seed
+    pool = get_executor()
+    if pool is None:
+        elo_sum, placement_counts = simulate_chunks(bracket, simulations, seed)
+    else:
+        workers = min(WORKERS, max(1, simulations // CHUNK_SIZE))
+        shares = [simulations // workers + (1 if worker < simulations % workers else 0) for worker in range(workers)]
+        futures = [pool.submit(simulate_chunks, bracket, share, seed + worker * simulations)
+                   for worker, share in enumerate(shares) if share]
+        results = [future.result() for future in futures]
+        elo_sum = sum(result[0] for result in results)
+        placement_counts = sum(result[1] for result in results)
+    logger.debug('Projected %s simulations of %s matches', simulations, len(bracket.matches))
+    return Projection(players, elo_sum / simulations, placement_counts, simulations)
@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+from logger import get_logger
+from metrics import get_status
+
+logger = get_logger(os.path.basename(__file__))
+
+PRIORITY_RATINGS = 0
+PRIORITY_POLL = 1
+PRIORITY_ANNOUNCE = 2
+PRIORITY_COSMETIC = 3
+
+SERVICE_LIMITS = {
+    'challonge': (float(os.getenv('QUOTA_CHALLONGE_RATE', 2)), float(os.getenv('QUOTA_CHALLONGE_BURST', 10))),
+    'sheets.read': (float(os.getenv('QUOTA_SHEETS_READ_RATE', 1)), float(os.getenv('QUOTA_SHEETS_READ_BURST', 10))),
+    'sheets.write': (float(os.getenv('QUOTA_SHEETS_WRITE_RATE', 1)), float(os.getenv('QUOTA_SHEETS_WRITE_BURST', 10))),
+    'drive': (float(os.getenv('QUOTA_DRIVE_RATE', 5)), float(os.getenv('QUOTA_DRIVE_BURST', 10))),
+    'discord': (float(os.getenv('QUOTA_DISCORD_RATE', 2.5)), float(os.getenv('QUOTA_DISCORD_BURST', 5))),
+}
+MAX_RETRIES = int(os.getenv('QUOTA_MAX_RETRIES', 5))
+BACKOFF_BASE = float(os.getenv('QUOTA_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.getenv('QUOTA_BACKOFF_MAX', 30))
+RATE_LIMIT_STATUSES = (429, 503)
+
+
+def get_retry_after(ex):
+    status = get_status(ex)
+    if status not in RATE_LIMIT_STATUSES:
+        return None
+    response = getattr(ex, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(ex, 'resp', None) or {}
+    retry_after = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_transient(ex):
+    status = get_status(ex)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(ex, (OSError, TimeoutError))
+
+
+def get_backoff(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay += retry_after
+    return delay
+
+
+class TokenBucket:
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.condition = threading.Condition()
+        self.waiters = []
+        self.sequence = itertools.count()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=PRIORITY_POLL):
+        if self.rate <= 0:
+            return
+        with self.condition:
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.refill(now)
+                    if self.waiters[0] != entry:
+                        self.condition.wait()
+                        continue
+                    if now >= self.blocked_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    self.condition.wait(max(self.blocked_until - now, (1 - self.tokens) / self.rate))
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+
+    def penalize(self, delay):
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0
+            self.condition.notify_all()
+        logger.warning('%s quota exhausted, pausing requests for %.2fs', self.name, delay)
+
+
+buckets = {}
+buckets_lock = threading.Lock()
+
+
+def get_bucket(service, key=None):
+    name = f'{service}:{key}' if key else service
+    with buckets_lock:
+        if name not in buckets:
+            rate, capacity = SERVICE_LIMITS[service]
+            buckets[name] = TokenBucket(name, rate, capacity)
+        return buckets[name]
+
+
+def call_with_quota(service, request, *args, priority=PRIORITY_POLL, key=None, **kwargs):
+    bucket = get_bucket(service, key)
+    for attempt in range(MAX_RETRIES):
+        bucket.acquire(priority)
+        try:
+            return request(*args, **kwargs)
+        except Exception as ex:
+            if attempt == MAX_RETRIES - 1 or not is_transient(ex):
+                raise
+            retry_after = get_retry_after(ex)
+            if retry_after:
+                bucket.penalize(retry_after)
+            delay = get_backoff(attempt)
+            logger.warning('%s request failed, retry %s of %s in %.2fs. ERROR: %s', service, attempt + 1,
+                           MAX_RETRIES - 1, delay, ex)
+            time.sleep(delay)
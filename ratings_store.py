@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from checkpoint import DATA_DIR
+from logger import get_logger
+from users import User
+
+logger = get_logger(os.path.basename(__file__))
+
+RATINGS_PATH = os.path.join(DATA_DIR, 'ratings.sqlite3')
+
+SHEET_FIELDS = ('elo', 'calibration', 'matches_played', 'matches_won', 'tournaments_played')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    sheet_list TEXT NOT NULL,
+    username TEXT NOT NULL,
+    elo INTEGER NOT NULL,
+    calibration INTEGER NOT NULL,
+    matches_played INTEGER NOT NULL,
+    matches_won INTEGER NOT NULL,
+    tournaments_played INTEGER NOT NULL,
+    in_sheet INTEGER NOT NULL DEFAULT 0,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    synced_hash TEXT,
+    PRIMARY KEY (sheet_list, username)
+);
+CREATE TABLE IF NOT EXISTS rating_history (
+    sheet_list TEXT NOT NULL,
+    tournament_url TEXT NOT NULL,
+    match_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    elo INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (sheet_list, tournament_url, match_id, username)
+);
+CREATE INDEX IF NOT EXISTS rating_history_user ON rating_history (sheet_list, username);
+CREATE TABLE IF NOT EXISTS sheet_snapshot (
+    sheet_list TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    row_hash TEXT NOT NULL,
+    PRIMARY KEY (sheet_list, row_number)
+);
+CREATE TABLE IF NOT EXISTS sheet_revisions (
+    sheet_list TEXT PRIMARY KEY,
+    revision TEXT
+);
+"""
+
+
+def get_values_hash(values):
+    return hashlib.sha1("\x1f".join(str(value) for value in values).encode()).hexdigest()
+
+
+def get_user_hash(user):
+    return get_values_hash([user.username] + [getattr(user, field) for field in SHEET_FIELDS])
+
+
+class RatingsStore:
+    def __init__(self, sheet_list, path=RATINGS_PATH):
+        self.sheet_list = sheet_list
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def load_users(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT username, {', '.join(SHEET_FIELDS)} FROM players WHERE sheet_list = ? ORDER BY rowid",
+                (self.sheet_list,)).fetchall()
+        return [User(username=row[0], **dict(zip(SHEET_FIELDS, row[1:]))) for row in rows]
+
+    def save_users(self, users):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO players (sheet_list, username, {', '.join(SHEET_FIELDS)}, dirty) "
+                f"VALUES (?, ?, {', '.join('?' * len(SHEET_FIELDS))}, 1) "
+                f"ON CONFLICT (sheet_list, username) DO UPDATE SET "
+                f"{', '.join(f'{field} = excluded.{field}' for field in SHEET_FIELDS)}, dirty = 1",
+                [(self.sheet_list, user.username) + tuple(getattr(user, field) for field in SHEET_FIELDS)
+                 for user in users])
+
+    def record_match(self, tournament_url, match_id, players):
+        recorded_at = time.time()
+        with self.lock:
+            previous = {username: elo for username, elo in self.connection.execute(
+                f"SELECT username, elo FROM players WHERE sheet_list = ? AND username IN "
+                f"({', '.join('?' * len(players))})", (self.sheet_list,) + tuple(p.username for p in players))}
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO rating_history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(self.sheet_list, tournament_url, match_id, player.username,
+                      player.elo - previous.get(player.username, player.elo), player.elo, recorded_at)
+                     for player in players])
+        self.save_users(players)
+
+    def get_pending(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT username, {', '.join(SHEET_FIELDS)}, in_sheet FROM players "
+                f"WHERE sheet_list = ? AND dirty = 1 ORDER BY rowid", (self.sheet_list,)).fetchall()
+        new_users = []
+        updated_users = []
+        for row in rows:
+            user = User(username=row[0], **dict(zip(SHEET_FIELDS, row[1:-1])))
+            (updated_users if row[-1] else new_users).append(user)
+        return new_users, updated_users
+
+    def mark_appended(self, users):
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE players SET in_sheet = 1 WHERE sheet_list = ? AND username = ?",
+                                        [(self.sheet_list, user.username) for user in users])
+
+    def mark_synced(self, users):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"UPDATE players SET in_sheet = 1, synced_hash = ?, dirty = CASE WHEN "
+                f"{' AND '.join(f'{field} = ?' for field in SHEET_FIELDS)} THEN 0 ELSE dirty END "
+                f"WHERE sheet_list = ? AND username = ?",
+                [(get_user_hash(user),) + tuple(getattr(user, field) for field in SHEET_FIELDS) +
+                 (self.sheet_list, user.username) for user in users])
+
+    def reconcile(self, sheet_users):
+        changed = []
+        with self.lock:
+            known = {row[0]: row[1:] for row in self.connection.execute(
+                "SELECT username, synced_hash, dirty FROM players WHERE sheet_list = ?", (self.sheet_list,))}
+            with self.connection:
+                for user in sheet_users:
+                    user_hash = get_user_hash(user)
+                    synced_hash, dirty = known.get(user.username, (None, 0))
+                    if synced_hash == user_hash:
+                        continue
+                    if user.username in known and synced_hash is None and dirty:
+                        self.connection.execute("UPDATE players SET in_sheet = 1 WHERE sheet_list = ? AND username = ?",
+                                                (self.sheet_list, user.username))
+                        continue
+                    if user.username in known and synced_hash is not None:
+                        if dirty:
+                            logger.warning('%s was edited in the sheet and locally, '
+                                           'keeping the sheet values', user.username)
+                        else:
+                            logger.debug('%s was edited in the sheet', user.username)
+                    self.connection.execute(
+                        f"INSERT INTO players (sheet_list, username, {', '.join(SHEET_FIELDS)}, in_sheet, dirty, "
+                        f"synced_hash) VALUES (?, ?, {', '.join('?' * len(SHEET_FIELDS))}, 1, 0, ?) "
+                        f"ON CONFLICT (sheet_list, username) DO UPDATE SET "
+                        f"{', '.join(f'{field} = excluded.{field}' for field in SHEET_FIELDS)}, "
+                        f"in_sheet = 1, dirty = 0, synced_hash = excluded.synced_hash",
+                        (self.sheet_list, user.username) + tuple(getattr(user, field) for field in SHEET_FIELDS) +
+                        (user_hash,))
+                    changed.append(user)
+        logger.debug('Reconciliation finished. %s of %s rows changed in the sheet', len(changed), len(sheet_users))
+        return changed
+
+    def load_snapshot(self):
+        with self.lock:
+            return {row[0]: row[1:] for row in self.connection.execute(
+                "SELECT row_number, username, row_hash FROM sheet_snapshot WHERE sheet_list = ?", (self.sheet_list,))}
+
+    def save_snapshot(self, rows, last_row=None):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sheet_snapshot (sheet_list, row_number, username, row_hash) VALUES (?, ?, ?, ?)",
+                [(self.sheet_list, row_number, username, row_hash) for row_number, (username, row_hash) in rows.items()])
+            if last_row is not None:
+                self.connection.execute("DELETE FROM sheet_snapshot WHERE sheet_list = ? AND row_number > ?",
+                                        (self.sheet_list, last_row))
+
+    def get_sheet_revision(self):
+        with self.lock:
+            row = self.connection.execute("SELECT revision FROM sheet_revisions WHERE sheet_list = ?",
+                                          (self.sheet_list,)).fetchone()
+        return row[0] if row else None
+
+    def set_sheet_revision(self, revision):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO sheet_revisions (sheet_list, revision) VALUES (?, ?)",
+                                    (self.sheet_list, revision))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
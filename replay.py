@@ -0,0 +1,178 @@
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from elo import DEFAULT_ELO, DEFAULT_CALIBRATION, K_FACTOR, CALIBRATION_K_FACTOR, get_expected_score
+from logger import get_logger, set_level
+
+logger = get_logger(os.path.basename(__file__))
+
+ROSTER_FIELDS = ('username', 'elo', 'calibration', 'matches_played', 'matches_won', 'tournaments_played')
+HISTORY_FIELDS = ('tournament', 'player1', 'player2', 'winner')
+
+
+class ExpectedScoreTable:
+    def __init__(self):
+        self.low = 0
+        self.values = np.array([get_expected_score(0, 0)])
+
+    def lookup(self, diff):
+        low = min(int(diff.min()), self.low)
+        high = max(int(diff.max()), self.low + len(self.values) - 1)
+        if low < self.low or high >= self.low + len(self.values):
+            self.values = np.array([get_expected_score(0, value) for value in range(low, high + 1)])
+            self.low = low
+        return self.values[diff - self.low]
+
+
+class ReplayEngine:
+    def __init__(self, k_factor=K_FACTOR, calibration_k_factor=CALIBRATION_K_FACTOR, default_elo=DEFAULT_ELO,
+                 default_calibration=DEFAULT_CALIBRATION):
+        self.k_factor = k_factor
+        self.calibration_k_factor = calibration_k_factor
+        self.default_elo = default_elo
+        self.default_calibration = default_calibration
+        self.usernames = []
+        self.index = {}
+        self.initial = {field: [] for field in ROSTER_FIELDS[1:]}
+        self.expected_scores = ExpectedScoreTable()
+
+    def add_player(self, username, elo, calibration, matches_played=0, matches_won=0, tournaments_played=0):
+        if username in self.index:
+            return self.index[username]
+        self.index[username] = len(self.usernames)
+        self.usernames.append(username)
+        for field, value in zip(ROSTER_FIELDS[1:], (elo, calibration, matches_played, matches_won,
+                                                    tournaments_played)):
+            self.initial[field].append(value)
+        return self.index[username]
+
+    def load_roster(self, rows):
+        for row in rows:
+            try:
+                self.add_player(row['username'], *(int(row[field]) for field in ROSTER_FIELDS[1:]))
+            except (KeyError, TypeError, ValueError) as ex:
+                logger.error('Skipping invalid roster row %s. ERROR: %s', row, ex)
+
+    def get_player(self, username):
+        if username in self.index:
+            return self.index[username]
+        return self.add_player(username, self.default_elo, self.default_calibration)
+
+    def encode_history(self, rows):
+        tournaments = {}
+        player1 = []
+        player2 = []
+        player1_won = []
+        tournament_codes = []
+        for row in rows:
+            if row['winner'] not in (row['player1'], row['player2']) or row['player1'] == row['player2']:
+                logger.error('Skipping invalid history row %s', row)
+                continue
+            tournament_codes.append(tournaments.setdefault(row['tournament'], len(tournaments)))
+            player1.append(self.get_player(row['player1']))
+            player2.append(self.get_player(row['player2']))
+            player1_won.append(row['winner'] == row['player1'])
+        return (np.array(player1, dtype=np.int64), np.array(player2, dtype=np.int64),
+                np.array(player1_won, dtype=np.float64), np.array(tournament_codes, dtype=np.int64))
+
+    @staticmethod
+    def get_waves(player1, player2, players_count):
+        last_wave = [-1] * players_count
+        waves = np.empty(len(player1), dtype=np.int64)
+        for position, (first, second) in enumerate(zip(player1.tolist(), player2.tolist())):
+            wave = max(last_wave[first], last_wave[second]) + 1
+            last_wave[first] = last_wave[second] = waves[position] = wave
+        order = np.argsort(waves, kind='stable')
+        return np.split(order, np.flatnonzero(np.diff(waves[order])) + 1)
+
+    def run(self, history_rows):
+        player1, player2, player1_won, tournament_codes = self.encode_history(history_rows)
+        elo = np.array(self.initial['elo'], dtype=np.int64)
+        calibration = np.array(self.initial['calibration'], dtype=np.int64)
+        matches_played = np.array(self.initial['matches_played'], dtype=np.int64)
+        matches_won = np.array(self.initial['matches_won'], dtype=np.int64)
+        tournaments_played = np.array(self.initial['tournaments_played'], dtype=np.int64)
+
+        if len(player1):
+            appearances = np.unique(np.concatenate([tournament_codes, tournament_codes]) * len(self.usernames) +
+                                    np.concatenate([player1, player2]))
+            np.add.at(tournaments_played, appearances % len(self.usernames), 1)
+
+        waves = self.get_waves(player1, player2, len(self.usernames)) if len(player1) else []
+        for wave in waves:
+            first = player1[wave]
+            second = player2[wave]
+            first_score = player1_won[wave]
+            second_score = 1 - first_score
+
+            first_calibration = calibration[first]
+            second_calibration = calibration[second]
+            first_calibration -= first_calibration > 0
+            second_calibration -= second_calibration > 0
+            calibration[first] = first_calibration
+            calibration[second] = second_calibration
+
+            first_k = np.where(first_calibration > 0, self.calibration_k_factor, self.k_factor)
+            second_k = np.where(second_calibration > 0, self.calibration_k_factor, self.k_factor)
+
+            diff = elo[second] - elo[first]
+            first_expected = self.expected_scores.lookup(diff)
+            second_expected = self.expected_scores.lookup(-diff)
+
+            elo[first] += np.trunc(first_k * (first_score - first_expected)).astype(np.int64)
+            elo[second] += np.trunc(second_k * (second_score - second_expected)).astype(np.int64)
+            matches_played[first] += 1
+            matches_played[second] += 1
+            matches_won[first] += first_score.astype(np.int64)
+            matches_won[second] += second_score.astype(np.int64)
+
+        logger.debug('Replayed %s matches in %s waves for %s players', len(player1), len(waves), len(self.usernames))
+        return {
+            'username': self.usernames,
+            'elo': elo,
+            'calibration': calibration,
+            'matches_played': matches_played,
+            'matches_won': matches_won,
+            'tournaments_played': tournaments_played,
+        }
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        yield from csv.DictReader(file)
+
+
+def write_ratings(path, ratings):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(ROSTER_FIELDS)
+        writer.writerows(zip(ratings['username'], *(ratings[field].tolist() for field in ROSTER_FIELDS[1:])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recalculate ratings from the full match history.')
+
+    parser.add_argument('--history', type=str, required=True,
+                        help='CSV with ordered matches: ' + ', '.join(HISTORY_FIELDS))
+    parser.add_argument('--roster', type=str, help='CSV with starting ratings: ' + ', '.join(ROSTER_FIELDS))
+    parser.add_argument('--output', type=str, default='ratings.csv', help='Where to write the recalculated ratings')
+    parser.add_argument('--k-factor', type=int, default=K_FACTOR)
+    parser.add_argument('--calibration-k-factor', type=int, default=CALIBRATION_K_FACTOR)
+    parser.add_argument('--default-elo', type=int, default=DEFAULT_ELO)
+    parser.add_argument('--default-calibration', type=int, default=DEFAULT_CALIBRATION)
+    parser.add_argument('--log-level', type=str.upper, default=os.getenv('LOG_LEVEL', 'DEBUG'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Logging level')
+    args = parser.parse_args()
+    set_level(args.log_level)
+
+    engine = ReplayEngine(args.k_factor, args.calibration_k_factor, args.default_elo, args.default_calibration)
+    if args.roster:
+        engine.load_roster(read_csv(args.roster))
+    started = time.perf_counter()
+    ratings = engine.run(read_csv(args.history))
+    logger.info('Replay finished in %.2fs', time.perf_counter() - started)
+    write_ratings(args.output, ratings)
@@ -0,0 +1,189 @@
+import atexit
+import os
+import threading
+import time
+
+from google_sheets_manager import follows_revision
+from logger import get_logger
+from ratings_store import get_user_hash, get_values_hash
+from users import User
+
+logger = get_logger(os.path.basename(__file__))
+
+
+def parse_sheet_row(row, row_number=None):
+    try:
+        return User(username=row[0], elo=int(row[1]), calibration=int(row[2]), matches_played=int(row[3]),
+                    matches_won=int(row[4]), tournaments_played=int(row[5]))
+    except (IndexError, ValueError) as ex:
+        logger.error('Skipping invalid sheet row %s %s. ERROR: %s', row_number or '', row, ex)
+        return None
+
+
+def parse_sheet_rows(rows):
+    users = []
+    for row in rows or []:
+        if row:
+            user = parse_sheet_row(row)
+            if user is not None:
+                users.append(user)
+    return users
+
+
+def get_snapshot_user_rows(snapshot):
+    user_rows = {}
+    for row_number, (username, _) in sorted(snapshot.items()):
+        if username and username not in user_rows:
+            user_rows[username] = row_number
+    return user_rows
+
+
+class SheetsMirror:
+    SYNC_INTERVAL = float(os.getenv('SHEET_SYNC_INTERVAL', 5))
+    RECONCILE_INTERVAL = float(os.getenv('SHEET_RECONCILE_INTERVAL', 300))
+
+    def __init__(self, sheets_manager, ratings_store, on_sheet_changes=None):
+        self.sheets_manager = sheets_manager
+        self.ratings_store = ratings_store
+        self.on_sheet_changes = on_sheet_changes
+        self.sync_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_reconcile = 0
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name=f'sheets-mirror-{self.ratings_store.sheet_list}',
+                                       daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        self.wake.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if time.monotonic() - self.last_reconcile >= self.RECONCILE_INTERVAL:
+                self.reconcile()
+            self.sync()
+            self.wake.wait(self.SYNC_INTERVAL)
+            self.wake.clear()
+
+    def sync(self):
+        with self.sync_lock:
+            new_users, updated_users = self.ratings_store.get_pending()
+            if not new_users and not updated_users:
+                return True
+            revision = self.get_known_revision()
+            write_count = self.sheets_manager.write_count
+            try:
+                self.sheets_manager.add_new_users(new_users)
+                self.ratings_store.mark_appended(new_users)
+                for user in updated_users:
+                    self.sheets_manager.queue_user_update(user)
+                self.sheets_manager.flush_updates()
+            except Exception as ex:
+                logger.error('Failed to mirror ratings to Google Sheets. ERROR: %s', ex)
+                return False
+            self.ratings_store.mark_synced(new_users + updated_users)
+            self.record_own_writes(new_users + updated_users, revision, self.sheets_manager.write_count - write_count)
+            logger.debug('Mirrored %s new and %s updated users to Google Sheets', len(new_users), len(updated_users))
+            return True
+
+    def get_known_revision(self):
+        known_revision = self.ratings_store.get_sheet_revision()
+        if known_revision is None:
+            return None
+        try:
+            revision = self.sheets_manager.get_revision()
+        except Exception as ex:
+            logger.warning('Failed to read the sheet revision before mirroring. ERROR: %s', ex)
+            return None
+        return revision if revision == known_revision else None
+
+    def record_own_writes(self, users, previous_revision, writes):
+        user_rows = dict(self.sheets_manager.user_rows or {})
+        self.ratings_store.save_snapshot({user_rows[user.username]: (user.username, get_user_hash(user))
+                                          for user in users if user.username in user_rows})
+        if previous_revision is None or not writes:
+            return
+        try:
+            revision = self.sheets_manager.rows_revision or self.sheets_manager.get_revision()
+        except Exception as ex:
+            logger.warning('Failed to read the sheet revision after mirroring. ERROR: %s', ex)
+            return
+        if follows_revision(previous_revision, revision, writes):
+            self.ratings_store.set_sheet_revision(revision)
+            logger.debug('Sheet revision %s recorded after our own writes', revision)
+        else:
+            logger.debug('Sheet revision moved from %s to %s over %s writes, the next reconcile reads the roster',
+                         previous_revision, revision, writes)
+
+    def read_changed_rows(self, snapshot):
+        changed_rows = {}
+        users = []
+        last_row = self.sheets_manager.first_row - 1
+        for row_number, row in self.sheets_manager.iter_user_rows():
+            last_row = row_number
+            row_hash = get_values_hash(row)
+            username = row[0] if row else ''
+            if snapshot.get(row_number) == (username, row_hash):
+                continue
+            changed_rows[row_number] = (username, row_hash)
+            if row:
+                user = parse_sheet_row(row, row_number)
+                if user is not None:
+                    users.append(user)
+        return users, changed_rows, last_row
+
+    def reconcile(self):
+        self.last_reconcile = time.monotonic()
+        with self.sync_lock:
+            snapshot = self.ratings_store.load_snapshot()
+            try:
+                revision = self.sheets_manager.get_revision()
+                if snapshot and revision is not None and revision == self.ratings_store.get_sheet_revision():
+                    logger.debug('Sheet revision %s is unchanged, skipping the roster read', revision)
+                    if self.sheets_manager.user_rows is None:
+                        self.sheets_manager.set_user_rows(get_snapshot_user_rows(snapshot), revision)
+                    return []
+                users, changed_rows, last_row = self.read_changed_rows(snapshot)
+            except Exception as ex:
+                logger.error('Failed to read Google Sheets for reconciliation. ERROR: %s', ex)
+                return []
+            changed = self.ratings_store.reconcile(users)
+            self.ratings_store.save_snapshot(changed_rows, last_row)
+            if revision is not None:
+                self.ratings_store.set_sheet_revision(revision)
+            snapshot.update(changed_rows)
+            self.sheets_manager.set_user_rows(get_snapshot_user_rows(
+                {row_number: row for row_number, row in snapshot.items() if row_number <= last_row}), revision)
+            logger.debug('Roster scanned up to row %s. %s rows changed since the last snapshot',
+                         last_row, len(changed_rows))
+        if changed and self.on_sheet_changes is not None:
+            self.on_sheet_changes(changed)
+        return changed
+
+    def flush(self):
+        return self.sync()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.sync()
+
+
+mirrors = []
+
+
+def register_mirror(mirror):
+    mirrors.append(mirror)
+
+
+@atexit.register
+def stop_mirrors():
+    for mirror in mirrors:
+        mirror.stop()
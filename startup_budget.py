@@ -0,0 +1,78 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+MODULE_BUDGETS = {
+    'tournament_start': float(os.getenv('STARTUP_BUDGET_TOURNAMENT_START', 0.25)),
+    'telegram_bot': float(os.getenv('STARTUP_BUDGET_TELEGRAM_BOT', 5)),
+}
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def parse_import_times(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            imports.append((int(cumulative) / 1000000, name.rstrip()))
+    return imports
+
+
+def measure_import(module):
+    env = dict(os.environ)
+    env.setdefault('BOT_TG_TOKEN', '0:startup-budget')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT.format(module=module)],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f'Import of {module} failed: {result.stderr.strip().splitlines()[-1:]}')
+    elapsed = float(result.stdout.strip().splitlines()[-1])
+    top_level = [(seconds, name.strip()) for seconds, name in parse_import_times(result.stderr)
+                 if name.startswith('   ') and not name.startswith('    ')]
+    return elapsed, sorted(top_level, reverse=True)
+
+
+def check_budgets(budgets, runs, top):
+    over_budget = []
+    for module, budget in budgets.items():
+        timings = []
+        imports = []
+        for _ in range(runs):
+            elapsed, imports = measure_import(module)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        status = "OK" if median <= budget else "OVER BUDGET"
+        print(f"{module}: median {median:.3f}s over {runs} runs, budget {budget:.3f}s - {status}")
+        for seconds, name in imports[:top]:
+            print(f"    {seconds:.3f}s {name}")
+        if median > budget:
+            over_budget.append(module)
+    return over_budget
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure cold-start import time against a budget")
+    parser.add_argument('--module', action='append', default=[],
+                        help="module=seconds budget to check, defaults to the entry points")
+    parser.add_argument('--runs', type=int, default=5, help="Number of fresh interpreters per module")
+    parser.add_argument('--top', type=int, default=5, help="Number of slowest direct imports to show")
+    args = parser.parse_args()
+
+    budgets = dict(MODULE_BUDGETS)
+    if args.module:
+        budgets = {}
+        for item in args.module:
+            module, _, seconds = item.partition('=')
+            budgets[module] = float(seconds) if seconds else MODULE_BUDGETS.get(module, 1)
+
+    over_budget = check_budgets(budgets, args.runs, args.top)
+    if over_budget:
+        logger.error("Cold start is over budget for: %s", ', '.join(over_budget))
+        sys.exit(1)
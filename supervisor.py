@@ -0,0 +1,64 @@
+import os
+import threading
+
+from dotenv import load_dotenv, find_dotenv
+
+from logger import get_logger
+from metrics import start_metrics_server
+from tournament_start import TournamentSession
+
+load_dotenv(find_dotenv(), verbose=True, override=True)
+
+logger = get_logger(os.path.basename(__file__))
+
+
+class TournamentSupervisor:
+    def __init__(self):
+        import challonge
+
+        self.sessions = {}
+        self.threads = {}
+        self.lock = threading.Lock()
+        challonge.set_credentials(os.getenv('CHALLONGE_LOGIN'), os.getenv('CHALLONGE_API_KEY'))
+        start_metrics_server()
+
+    def start(self, config):
+        with self.lock:
+            thread = self.threads.get(config.tournament_url)
+            if thread is not None and thread.is_alive():
+                raise ValueError(f'Tournament {config.tournament_url} is already running')
+            session = TournamentSession(config)
+            thread = threading.Thread(target=self.run_session, args=(session,),
+                                      name=f'tournament-{config.tournament_url}', daemon=True)
+            self.sessions[config.tournament_url] = session
+            self.threads[config.tournament_url] = thread
+            thread.start()
+            logger.debug('Tournament %s started. Active sessions - %s', config.tournament_url, len(self.threads))
+            return session
+
+    def run_session(self, session):
+        try:
+            session.run()
+        finally:
+            with self.lock:
+                self.sessions.pop(session.config.tournament_url, None)
+                self.threads.pop(session.config.tournament_url, None)
+            logger.debug('Tournament %s session finished', session.config.tournament_url)
+
+    def stop(self, tournament_url):
+        with self.lock:
+            session = self.sessions.get(tournament_url)
+        if session is None:
+            return False
+        session.stop()
+        return True
+
+    def active_tournaments(self):
+        with self.lock:
+            return list(self.sessions)
+
+    def stop_all(self):
+        for tournament_url in self.active_tournaments():
+            self.stop(tournament_url)
+        for thread in list(self.threads.values()):
+            thread.join()
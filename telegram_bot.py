@@ -1,7 +1,5 @@
 import asyncio
 import os
-import subprocess
-import sys
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
@@ -14,6 +12,9 @@ from aiogram.types import (
     Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, FSInputFile,
 )
 
+from supervisor import TournamentSupervisor
+from tournament_start import TournamentConfig
+
 load_dotenv(find_dotenv(), verbose=True, override=True)
 
 TOKEN = os.getenv("BOT_TG_TOKEN")
@@ -23,9 +24,7 @@ form_router = Router()
 bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 dp.include_router(form_router)
-python_executable = sys.executable
-
-script_path = 'tournament_start.py'
+supervisor = TournamentSupervisor()
 
 
 class Settings(StatesGroup):
@@ -79,28 +78,8 @@ async def process_webhook_url(message: Message, state: FSMContext) -> None:
 
 
 def prepare_tournament(data):
-    variables_to_update = {
-        'TOURNAMENT_URL': '\"' + data['url'] + '\"',
-        'SHEET_LIST': '\"' + data['sheet_list'] + '\"',
-        'DISCORD_WEBHOOK_URL': '\"' + data['webhook_url'] + '\"'
-    }
-
-    with open('.env', 'r+') as file:
-        lines = file.readlines()
-        for var, new_value in variables_to_update.items():
-            for i, line in enumerate(lines):
-                if line.startswith(var + '='):
-                    lines[i] = f'{var}={new_value}\n'
-                    break
-            else:
-                lines.append(f'{var}={new_value}\n')
-
-        file.seek(0)
-        file.writelines(lines)
-        file.truncate()
-
-    load_dotenv(find_dotenv(), verbose=True, override=True)
-    subprocess.run([python_executable, script_path])
+    config = TournamentConfig(data['url'], sheet_list=data['sheet_list'], webhook_url=data['webhook_url'])
+    supervisor.start(config)
 
 
 @form_router.message(Settings.finish)
@@ -108,8 +87,12 @@ async def process_finish(message: Message, state: FSMContext) -> None:
     data = await state.update_data(finish=message.text)
     await state.clear()
     if data['finish'] == "Start":
+        try:
+            prepare_tournament(data)
+        except ValueError as ex:
+            await message.answer(str(ex), reply_markup=ReplyKeyboardRemove())
+            return
         await message.answer("You can run a tournament on Challounge", reply_markup=ReplyKeyboardRemove())
-        prepare_tournament(data)
     else:
         await message.answer("Start is canceled, to re\-enter send */start\_tournament* again",
                              reply_markup=ReplyKeyboardRemove(),  parse_mode="MarkdownV2")
@@ -119,6 +102,15 @@ async def start_bot():
     await dp.start_polling(bot)
 
 
+@form_router.message(Command("tournaments"))
+async def tournaments_handler(message: Message) -> None:
+    tournaments = supervisor.active_tournaments()
+    if not tournaments:
+        await message.answer("No tournaments are running")
+        return
+    await message.answer("Running tournaments:\n" + "\n".join(tournaments))
+
+
 @form_router.message(Command("cancell"))
 @form_router.message(F.text.casefold() == "cancell")
 async def cancel_handler(message: Message, state: FSMContext) -> None:
@@ -0,0 +1,68 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from elo import DEFAULT_ELO, DEFAULT_CALIBRATION
+from replay import ReplayEngine, ROSTER_FIELDS
+from tournament_start import TournamentSession
+from users import User, Participant, UserRegistry
+
+
+def get_history(randomizer, usernames, tournaments=60, players=8, matches=30):
+    history = []
+    for tournament in range(tournaments):
+        lineup = randomizer.sample(usernames, players)
+        for _ in range(matches):
+            player1, player2 = randomizer.sample(lineup, 2)
+            history.append({'tournament': f't{tournament}', 'player1': player1, 'player2': player2,
+                            'winner': randomizer.choice((player1, player2))})
+    return history
+
+
+def play_live(roster, history):
+    session = TournamentSession.__new__(TournamentSession)
+    tournaments = {}
+    for row in history:
+        tournaments.setdefault(row['tournament'], []).append(row)
+    for rows in tournaments.values():
+        session.users_list = UserRegistry()
+        ids = {}
+        for row in rows:
+            for username in (row['player1'], row['player2']):
+                if username in ids:
+                    continue
+                ids[username] = len(ids) + 1
+                user = roster.get_by_username(username)
+                if user is None:
+                    user = roster.add(User(username=username, elo=DEFAULT_ELO, calibration=DEFAULT_CALIBRATION))
+                else:
+                    user.tournaments_played += 1
+                session.users_list.add(Participant(user, ids[username]))
+        for match_id, row in enumerate(rows, 1):
+            match = {'id': match_id, 'player1_id': ids[row['player1']], 'player2_id': ids[row['player2']],
+                     'winner_id': ids[row['winner']]}
+            session.set_elo_changes(match)
+            session.calculate_match(match)
+
+
+def test_replay_matches_live_rating():
+    randomizer = random.Random(7)
+    roster_rows = [{'username': f'player{position}', 'elo': randomizer.randint(800, 1400),
+                    'calibration': randomizer.choice((0, 0, 3, 10)), 'matches_played': randomizer.randint(0, 50),
+                    'matches_won': 0, 'tournaments_played': randomizer.randint(1, 10)} for position in range(24)]
+    usernames = [row['username'] for row in roster_rows] + [f'newcomer{position}' for position in range(8)]
+    history = get_history(randomizer, usernames)
+
+    roster = UserRegistry([User(**row) for row in roster_rows])
+    play_live(roster, history)
+
+    engine = ReplayEngine()
+    engine.load_roster(roster_rows)
+    ratings = engine.run(history)
+
+    replayed = {username: {field: int(ratings[field][position]) for field in ROSTER_FIELDS[1:]}
+                for position, username in enumerate(ratings['username'])}
+    live = {user.username: {field: getattr(user, field) for field in ROSTER_FIELDS[1:]} for user in roster}
+    assert replayed == live
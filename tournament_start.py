@@ -1,180 +1,377 @@
-from time import sleep
-from discord_bot import *
 import argparse
-import challonge
 from google_sheets_manager import *
 from users import *
+from logger import get_logger, set_level
+from match_tracker import MatchTracker
+from poll_scheduler import PollScheduler
+from live_scoreboard import LiveScoreboard, MAX_DESCRIPTION_LENGTH
+from checkpoint import TournamentCheckpoint
+from ratings_store import RatingsStore
+from elo import DEFAULT_ELO, DEFAULT_CALIBRATION, get_k_factor, get_expected_score
+from sheets_mirror import SheetsMirror, register_mirror
+from challonge_client import get_client
+from metrics import registry, start_metrics_server, get_status
+from quota import get_retry_after, is_transient, PRIORITY_COSMETIC
 import os
+import threading
+import time
 from dotenv import load_dotenv, find_dotenv
 
 logger = get_logger(os.path.basename(__file__))
 
 load_dotenv(find_dotenv(), verbose=True, override=True)
 
-googleSheetsManager = GoogleSheetsManager(os.getenv("SHEET_ID"), os.getenv("SHEET_LIST") + "!" +
-                                          os.getenv("SHEET_RANGE"))
-users_list = []
-all_users_from_sheets = []
-sent_messages = {}
-
-
-def get_user_by_id(id):
-    logger.debug("Getting user by id")
-    for item in users_list:
-        if item.id == id:
-            logger.debug("User was successfully found")
-            return item
-    logger.error(f'User with id - {id} was not found')
-    return None
-
-
-def parse_users_from_sheets():
-    logger.debug("Parsing user's from sheets")
-    users_sheets = googleSheetsManager.get_users_data()
-    if not users_sheets:
-        return
-    for user_item in users_sheets:
-        if not user_item:
-            continue
-        all_users_from_sheets.append(User(username=user_item[0], elo=int(user_item[1]), calibration=int(user_item[2]),
-                                          matches_played=int(user_item[3]), matches_won=int(user_item[4]),
-                                          tournaments_played=int(user_item[5])))
-        logger.debug(
-            f'New User object has been created. Username - {user_item[0]}. ELO - {user_item[1]}. '
-            f'Calibration - {user_item[2]}')
-
-
-def check_users_in_sheet(participants):
-    for participant in participants:
-        existing_user = next((user for user in all_users_from_sheets if user.username == participant['name']), None)
-
-        if not existing_user:
-            new_user = User(username=participant['name'], elo=1000, calibration=10, id=participant['id'])
-            googleSheetsManager.add_new_user(new_user)
-            users_list.append(new_user)
-            logger.debug(f'Created new user. Username - {new_user.username}. ELO - {new_user.elo}. '
-                         f'Calibration - {new_user.calibration}')
+sheets_managers = {}
+rosters = {}
+ratings_stores = {}
+sheets_mirrors = {}
+shared_lock = threading.RLock()
+roster_lock = threading.RLock()
+
+
+def get_sheets_manager(sheet_list):
+    range_name = sheet_list + "!" + os.getenv("SHEET_RANGE")
+    with shared_lock:
+        if range_name not in sheets_managers:
+            sheets_managers[range_name] = GoogleSheetsManager(os.getenv("SHEET_ID"), range_name)
+        return sheets_managers[range_name]
+
+
+def get_roster(sheet_list):
+    with shared_lock:
+        if sheet_list not in rosters:
+            rosters[sheet_list] = UserRegistry()
+        return rosters[sheet_list]
+
+
+def get_ratings_store(sheet_list):
+    with shared_lock:
+        if sheet_list not in ratings_stores:
+            ratings_stores[sheet_list] = RatingsStore(sheet_list)
+        return ratings_stores[sheet_list]
+
+
+def get_sheets_mirror(sheet_list):
+    roster = get_roster(sheet_list)
+
+    def apply_sheet_changes(users):
+        with roster_lock:
+            for user in users:
+                roster.update(user)
+
+    with shared_lock:
+        if sheet_list not in sheets_mirrors:
+            mirror = SheetsMirror(get_sheets_manager(sheet_list), get_ratings_store(sheet_list), apply_sheet_changes)
+            sheets_mirrors[sheet_list] = mirror
+            register_mirror(mirror)
+        return sheets_mirrors[sheet_list]
+
+
+class TournamentConfig:
+    def __init__(self, tournament_url, sheet_list=None, webhook_url=None, mode="poll", webhook_host=None,
+                 webhook_port=None, scoreboard=False, projections=True):
+        self.tournament_url = tournament_url
+        self.sheet_list = sheet_list or os.getenv("SHEET_LIST")
+        self.webhook_url = webhook_url or os.getenv("DISCORD_WEBHOOK_URL")
+        self.mode = mode
+        self.webhook_host = webhook_host
+        self.webhook_port = webhook_port
+        self.scoreboard = scoreboard
+        self.projections = projections
+
+
+class TournamentSession:
+    def __init__(self, config):
+        from discord_bot import get_sender
+
+        self.config = config
+        self.ratings_store = get_ratings_store(config.sheet_list)
+        self.sheets_mirror = get_sheets_mirror(config.sheet_list)
+        self.all_users_from_sheets = get_roster(config.sheet_list)
+        self.users_list = UserRegistry()
+        self.sent_messages = {}
+        self.match_tracker = MatchTracker()
+        self.poll_scheduler = PollScheduler()
+        self.sender = get_sender(config.webhook_url)
+        self.challonge = get_client()
+        self.checkpoint = TournamentCheckpoint(config.tournament_url)
+        self.live_scoreboard = None
+        self.pending_projection = None
+        self.projection_thread = None
+        self.projection_lock = threading.Lock()
+        self.projections_closed = False
+        self.last_projection = None
+        if config.scoreboard:
+            self.enable_live_scoreboard()
+
+    def run(self):
+        if self.config.mode == "webhook":
+            self.start_webhook(self.config.tournament_url, self.config.webhook_host, self.config.webhook_port)
         else:
-            existing_user.id = participant['id']
-            existing_user.tournaments_played += 1
-            users_list.append(existing_user)
-            logger.debug(f'User {existing_user.username} already exists.')
-
-
-def get_tournament_user_list():
-    logger.debug("Getting a list of tournament players")
-    message = ""
-    for user in users_list:
-        message += f"{user.username} ({user.elo})\n"
-    logger.debug("List of tournament players created successfully")
-    return message
-
-
-def discord_sender(message):
-    logger.debug("Sending message to Discord Channel")
-    send_message(message)
-    logger.debug("Message sent successfully")
-
-
-def change_elo_in_sheets(players):
-    logger.debug("Updating ELO for players")
-    for player in players:
-        googleSheetsManager.update_user_by_username(player)
-
-
-def calculate_match(match):
-    logger.debug(f'Calculating ELO for matchID - {match["id"]}')
-    player1 = get_user_by_id(match['player1_id'])
-    player2 = get_user_by_id(match['player2_id'])
-
-    K1 = K2 = 50
-
-    if player1.calibration > 0:
-        K1 = 200
-
-    if player2.calibration > 0:
-        K2 = 200
-
-    SA1 = 1 if player1.id == match['winner_id'] else 0
-    EA1 = 1 / (1 + pow(10, (player2.elo - player1.elo) / 400))
-
-    SA2 = 1 if player2.id == match['winner_id'] else 0
-    EA2 = 1 / (1 + pow(10, (player1.elo - player2.elo) / 400))
-
-    rating_changes1 = int(K1 * (SA1 - EA1))
-    rating_changes2 = int(K2 * (SA2 - EA2))
-
-    player1.elo += rating_changes1
-    player2.elo += rating_changes2
-
-    player1.rating_sum += rating_changes1
-    player2.rating_sum += rating_changes2
-
-    player1.matches_played += 1
-    player2.matches_played += 1
-
-    if SA1 > 0:
-        player1.winner = True
-        player2.winner = False
-        player1.matches_won += 1
-    else:
-        player1.winner = False
-        player2.winner = True
-        player2.matches_won += 1
-
-    logger.debug(f'Player1: K: {K1}, SA: {SA1}, EA: {EA1}')
-    logger.debug(f'Player2: K: {K2}, SA: {SA2}, EA: {EA2}')
-
-    change_elo_in_sheets([player1, player2])
-
-    return player1, player2
+            self.start_polling(self.config.tournament_url)
+
+    def stop(self):
+        logger.debug('Stopping tournament %s', self.config.tournament_url)
+        self.poll_scheduler.stop()
+
+    def get_user_by_id(self, id):
+        logger.debug("Getting user by id")
+        user = self.users_list.get_by_id(id)
+        if user is None:
+            logger.error('User with id - %s was not found', id)
+            return None
+        logger.debug("User was successfully found")
+        return user
+
+    def load_users_from_store(self):
+        logger.debug("Reconciling the local ratings store with sheets")
+        self.sheets_mirror.reconcile()
+        users = self.ratings_store.load_users()
+        self.all_users_from_sheets.add_many([user for user in users if user.username not in self.all_users_from_sheets])
+        self.sheets_mirror.start()
+        logger.debug('%s users loaded from the ratings store', len(users))
+
+    def check_users_in_sheet(self, participants):
+        new_users = []
+        for participant in participants:
+            existing_user = self.all_users_from_sheets.get_by_username(participant['name'])
+
+            if not existing_user:
+                new_user = User(username=participant['name'], elo=DEFAULT_ELO, calibration=DEFAULT_CALIBRATION)
+                new_users.append(new_user)
+                self.all_users_from_sheets.add(new_user)
+                self.users_list.add(Participant(new_user, participant['id']))
+                logger.debug('Created new user. Username - %s. ELO - %s. '
+                             'Calibration - %s', new_user.username, new_user.elo, new_user.calibration)
+            else:
+                existing_user.tournaments_played += 1
+                self.users_list.add(Participant(existing_user, participant['id']))
+                logger.debug('User %s already exists.', existing_user.username)
+
+    def get_tournament_user_list(self):
+        logger.debug("Getting a list of tournament players")
+        message = ""
+        for user in self.users_list:
+            message += f"{user.username} ({user.elo})\n"
+        logger.debug("List of tournament players created successfully")
+        return message
+
+    def discord_sender(self, message, timings=None):
+        logger.debug("Sending message to Discord Channel")
+        self.sender.send(message, timings)
+        logger.debug("Message queued successfully")
+
+    def get_users_rating_list(self):
+        lines = []
+        length = 0
+        standings = self.users_list.get_standings()
+        for position, user in enumerate(standings, 1):
+            delta = f", {user.rating_sum:+d}" if user.rating_sum else ""
+            line = (f"{position}. {user.username} ({user.elo} TRP{delta}) · "
+                    f"#{self.all_users_from_sheets.get_rank(user)}\n")
+            hidden = f"… and {len(standings) - position} more\n" if position < len(standings) else ""
+            if length + len(line) + len(hidden) > MAX_DESCRIPTION_LENGTH:
+                lines.append(f"… and {len(standings) - position + 1} more\n")
+                break
+            lines.append(line)
+            length += len(line)
+        return "".join(lines)
+
+    def get_ladder_ranks(self, players):
+        return [self.all_users_from_sheets.get_rank(player) for player in players]
+
+    def get_rank_changes(self, players, previous_ranks):
+        changes = []
+        for player, previous_rank, rank in zip(players, previous_ranks, self.get_ladder_ranks(players)):
+            if rank == previous_rank:
+                changes.append(f"- {player.username}: #{rank}")
+            else:
+                arrow = "⬆️" if rank < previous_rank else "⬇️"
+                changes.append(f"- {player.username}: #{previous_rank} → #{rank} {arrow}")
+        return "📊 Ladder\n" + "\n".join(changes)
+
+    def enable_live_scoreboard(self):
+        logger.debug("Live scoreboard mode enabled")
+        self.live_scoreboard = LiveScoreboard(self.sender)
+
+    def announce_match_opened(self, match_id, message):
+        if self.live_scoreboard is None:
+            self.discord_sender(message)
+            return
+        self.live_scoreboard.match_opened(match_id, message['description'])
+
+    def announce_match_finished(self, match_id, message, timings=None):
+        if self.live_scoreboard is None:
+            self.discord_sender(message, timings)
+            return
+        self.live_scoreboard.match_finished(match_id, message['description'], timings)
+        self.live_scoreboard.set_standings(self.get_users_rating_list())
+
+    def announce_standings(self, message):
+        if self.live_scoreboard is None:
+            self.discord_sender(message)
+            return
+        self.live_scoreboard.set_standings(message['description'], message['title'])
+        self.publish_scoreboard(force=True)
+
+    def get_players_snapshot(self):
+        return [User(username=player.username, elo=player.elo, calibration=player.calibration, id=player.id)
+                for player in self.users_list]
+
+    def get_projection_summary(self, matches, players):
+        from projection import project_tournament
+
+        try:
+            projection = project_tournament(matches, players)
+        except Exception as ex:
+            logger.error('Failed to project the tournament. ERROR: %s', ex)
+            return None
+        return projection.get_summary() if projection is not None else None
+
+    def update_projection(self, matches):
+        if not self.config.projections or not matches:
+            return
+        with self.projection_lock:
+            if self.projections_closed:
+                return
+            self.pending_projection = (matches, self.get_players_snapshot())
+            if self.projection_thread is None:
+                self.projection_thread = threading.Thread(target=self.run_projections, daemon=True,
+                                                          name=f'projection-{self.config.tournament_url}')
+                self.projection_thread.start()
+
+    def run_projections(self):
+        while True:
+            with self.projection_lock:
+                pending = self.pending_projection
+                self.pending_projection = None
+                if pending is None:
+                    self.projection_thread = None
+                    return
+            summary = self.get_projection_summary(*pending)
+            if summary is not None:
+                self.announce_projection(summary)
+
+    def announce_projection(self, summary):
+        with self.projection_lock:
+            if self.projections_closed or summary == self.last_projection:
+                return
+            self.last_projection = summary
+        if self.live_scoreboard is None:
+            self.discord_sender({"title": "🔮 Projection", "description": summary})
+            return
+        self.live_scoreboard.set_projection(summary)
+        self.publish_scoreboard()
+
+    def close_projections(self):
+        with self.projection_lock:
+            self.projections_closed = True
+            self.pending_projection = None
+
+    def publish_scoreboard(self, force=False):
+        if self.live_scoreboard is None:
+            return
+        try:
+            self.live_scoreboard.publish(force)
+        except Exception as ex:
+            logger.error('Failed to update the live scoreboard. ERROR: %s', ex)
+
+    def save_ratings(self, players):
+        logger.debug("Updating ELO for players")
+        self.ratings_store.save_users(players)
+        self.sheets_mirror.notify()
+
+    def save_match_result(self, match_id, players):
+        self.ratings_store.record_match(self.config.tournament_url, match_id, players)
+        self.sheets_mirror.notify()
+
+    def flush_sheet_updates(self):
+        return self.sheets_mirror.flush()
+
+    def calculate_match(self, match):
+        logger.debug('Calculating ELO for matchID - %s', match['id'])
+        player1 = self.get_user_by_id(match['player1_id'])
+        player2 = self.get_user_by_id(match['player2_id'])
+
+        K1 = get_k_factor(player1.calibration)
+        K2 = get_k_factor(player2.calibration)
+
+        SA1 = 1 if player1.id == match['winner_id'] else 0
+        EA1 = get_expected_score(player1.elo, player2.elo)
+
+        SA2 = 1 if player2.id == match['winner_id'] else 0
+        EA2 = get_expected_score(player2.elo, player1.elo)
+
+        rating_changes1 = int(K1 * (SA1 - EA1))
+        rating_changes2 = int(K2 * (SA2 - EA2))
+
+        player1.elo += rating_changes1
+        player2.elo += rating_changes2
+
+        player1.rating_sum += rating_changes1
+        player2.rating_sum += rating_changes2
+
+        player1.matches_played += 1
+        player2.matches_played += 1
+
+        if SA1 > 0:
+            player1.winner = True
+            player2.winner = False
+            player1.matches_won += 1
+        else:
+            player1.winner = False
+            player2.winner = True
+            player2.matches_won += 1
 
+        logger.debug('Player1: K: %s, SA: %s, EA: %s', K1, SA1, EA1)
+        logger.debug('Player2: K: %s, SA: %s, EA: %s', K2, SA2, EA2)
 
-def set_elo_changes(match):
-    player1 = get_user_by_id(match['player1_id'])
-    player2 = get_user_by_id(match['player2_id'])
+        return player1, player2
 
-    K1 = K2 = 50
+    def set_elo_changes(self, match):
+        player1 = self.get_user_by_id(match['player1_id'])
+        player2 = self.get_user_by_id(match['player2_id'])
 
-    if player1.calibration > 0:
-        K1 = 200
-        player1.calibration -= 1
+        K1 = get_k_factor(player1.calibration)
+        K2 = get_k_factor(player2.calibration)
 
-    if player2.calibration > 0:
-        K2 = 200
-        player2.calibration -= 1
+        if player1.calibration > 0:
+            player1.calibration -= 1
 
-    EA1 = 1 / (1 + pow(10, (player2.elo - player1.elo) / 400))
-    EA2 = 1 / (1 + pow(10, (player1.elo - player2.elo) / 400))
+        if player2.calibration > 0:
+            player2.calibration -= 1
 
-    player1.r_win = int(K1 * (1 - EA1))
-    player1.r_lose = int(K1 * (0 - EA1))
+        EA1 = get_expected_score(player1.elo, player2.elo)
+        EA2 = get_expected_score(player2.elo, player1.elo)
 
-    player2.r_win = int(K2 * (1 - EA2))
-    player2.r_lose = int(K2 * (0 - EA2))
+        player1.r_win = int(K1 * (1 - EA1))
+        player1.r_lose = int(K1 * (0 - EA1))
 
-    logger.debug(f"player1.r_win = {player1.r_win}")
-    logger.debug(f"player1.r_lose = {player1.r_lose}")
+        player2.r_win = int(K2 * (1 - EA2))
+        player2.r_lose = int(K2 * (0 - EA2))
 
-    logger.debug(f"player2.r_win = {player2.r_win}")
-    logger.debug(f"player2.r_lose = {player2.r_lose}")
+        logger.debug("player1.r_win = %s", player1.r_win)
+        logger.debug("player1.r_lose = %s", player1.r_lose)
 
-    return player1, player2
+        logger.debug("player2.r_win = %s", player2.r_win)
+        logger.debug("player2.r_lose = %s", player2.r_lose)
 
+        return player1, player2
 
-def process_matches(current_matches):
-    logger.debug("Checking new matches")
-    for match in current_matches:
-        if match['id'] not in sent_messages:
-            if match['state'] == 'open':
+    def process_matches(self, current_matches):
+        logger.debug("Checking new matches")
+        changed_matches = self.match_tracker.changed_matches(current_matches)
+        for match in changed_matches:
+            sent = self.sent_messages.get(match['id'])
+            if match['state'] == 'open' and sent is None:
 
-                players = set_elo_changes(match)
+                players = self.set_elo_changes(match)
 
                 player1 = players[0]
                 player2 = players[1]
 
-                logger.debug(f"New match has started. ID: {match['id']}. Player1: {player1.username}. "
-                             f"Player2: {player2.username}")
+                logger.debug("New match has started. ID: %s. Player1: %s. "
+                             "Player2: %s", match['id'], player1.username, player2.username)
                 message = {
                     "title": "🏆 New Match Upcoming",
                     "description": f"{player1.username} ({player1.elo} TRP) vs {player2.username} ({player2.elo} TRP)",
@@ -185,15 +382,20 @@ def process_matches(current_matches):
                     }
                 }
 
-                discord_sender(message)
+                self.checkpoint.record_match(match['id'], 'open', players)
+                self.announce_match_opened(match['id'], message)
 
-                sent_messages[match['id']] = 'open'
-        elif match['state'] == 'complete':
-            if sent_messages.get(match['id']) == 'open':
-                players = calculate_match(match)
+                self.sent_messages[match['id']] = 'open'
+            elif match['state'] == 'complete' and sent != 'complete':
+                if sent is None:
+                    logger.debug("Match %s was completed before it was seen open", match['id'])
+                    self.set_elo_changes(match)
+                previous_ranks = self.get_ladder_ranks([self.get_user_by_id(match['player1_id']),
+                                                        self.get_user_by_id(match['player2_id'])])
+                players = self.calculate_match(match)
 
-                logger.debug(f"Match is over. ID: {match['id']}. Player1: {players[0].username}. "
-                             f"Player2: {players[1].username}")
+                logger.debug("Match is over. ID: %s. Player1: %s. "
+                             "Player2: %s", match['id'], players[0].username, players[1].username)
 
                 message = "🌚 Closed match: "
 
@@ -204,83 +406,230 @@ def process_matches(current_matches):
                 message = {
                     "title": "🏁 Finished match",
                     "description": description,
+                    "footer": {
+                        "text": self.get_rank_changes(players, previous_ranks),
+                    }
                 }
 
-                discord_sender(message)
-                sent_messages[match['id']] = 'complete'
-
-
-def start_polling(tournament_url):
-    try:
+                self.save_match_result(match['id'], players)
+                self.checkpoint.record_match(match['id'], 'complete', players)
+                self.announce_match_finished(match['id'], message, self.get_match_timings(match))
+                self.sent_messages[match['id']] = 'complete'
+            self.match_tracker.mark_match_seen(match)
+        return len(changed_matches)
+
+    def get_match_timings(self, match):
+        timings = [(time.time(), 'detected')]
+        completed_at = match.get('completed_at')
+        if hasattr(completed_at, 'timestamp'):
+            timings.append((completed_at.timestamp(), 'challonge'))
+        return timings
+
+    def fetch_tournament(self, tournament):
+        while True:
+            try:
+                return self.challonge.show_tournament(tournament)
+            except Exception as ex:
+                if not is_transient(ex) or self.poll_scheduler.stopped:
+                    raise
+                logger.warning("Challonge is unavailable, retrying later. ERROR: %s", ex)
+                self.poll_scheduler.rate_limited(get_retry_after(ex))
+                self.poll_scheduler.sleep()
+
+    def wait_for_tournament_start(self, tournament_url):
         logger.debug("Processing of the tournament has start")
-        tournament = challonge.tournaments.show(tournament_url)
+        tournament = self.fetch_tournament(tournament_url)
         tournamentID = tournament["id"]
         state = tournament["state"]
         logger.debug(state)
 
-        if state != "complete":
-            while state == "pending":
-                logger.debug("Waiting for the start of the tournament...")
-                # logger.debug(state)
-                state = challonge.tournaments.show(tournamentID)['state']
-                sleep(2)
-
-            logger.debug(f"Tournament has start. ID: {tournamentID}")
-
-            parse_users_from_sheets()
-            check_users_in_sheet(challonge.participants.index(tournamentID))
-
-            users_mess_list = ""
-
-            for user in users_list:
-                users_mess_list += f"{user.username} ({user.elo} TRP)\n"
-
-            message = {
-                "title": "📋 Tournament lineup: ",
-                "description": users_mess_list,
-            }
-
-            discord_sender(message)
-
-            while state != 'complete':
-                matches = challonge.matches.index(tournamentID)
-                process_matches(matches)
-                state = challonge.tournaments.show(tournamentID)['state']
-                sleep(2)
-
-            logger.debug(f"The tournament is over. ID: {tournamentID}")
-            users_mess_list = ""
-            for user in users_list:
-                users_mess_list += f"{user.username} ({user.elo} TRP)\n"
-
-            message = {
-                "title": "📋 Tournament is over! Updated rating:",
-                "description": users_mess_list,
-            }
-
-            discord_sender(message)
-
-    except ValueError as ex:
-        logger.error(ex.args[0])
-    except Exception as ex:
-        logger.error(f"Tournament with URL: {tournament_url} not found. ERROR: {ex}")
-
-
-def initialize_match(tournament_url=os.getenv("TOURNAMENT_URL")):
+        while state == "pending" and not self.poll_scheduler.stopped:
+            logger.debug("Waiting for the start of the tournament...")
+            self.poll_scheduler.sleep()
+            state = self.fetch_tournament(tournamentID)['state']
+            self.poll_scheduler.idle()
+
+        return tournamentID, state
+
+    def restore_checkpoint(self, restored):
+        logger.debug("Resuming tournament %s from checkpoint", self.config.tournament_url)
+        with roster_lock:
+            self.load_users_from_store()
+            for user in restored['users']:
+                roster_user = self.all_users_from_sheets.update(user)
+                self.users_list.add(Participant(roster_user, user.id, rating_sum=user.rating_sum, r_win=user.r_win,
+                                                r_lose=user.r_lose))
+        self.sent_messages.update(restored['sent_messages'])
+        self.save_ratings(self.users_list)
+
+    def announce_lineup(self, tournamentID):
+        logger.debug("Tournament has start. ID: %s", tournamentID)
+
+        restored = self.checkpoint.load()
+        if restored is not None:
+            self.restore_checkpoint(restored)
+            return
+
+        matches = None
+        if self.config.projections:
+            participants, matches = self.challonge.index_participants_with_matches(
+                tournamentID, matches_priority=PRIORITY_COSMETIC)
+            if isinstance(participants, Exception):
+                raise participants
+            if isinstance(matches, Exception):
+                logger.error("Failed to fetch matches for the projection. ERROR: %s", matches)
+                matches = None
+        else:
+            participants = self.challonge.index_participants(tournamentID)
+        with roster_lock:
+            self.load_users_from_store()
+            self.check_users_in_sheet(participants)
+            self.checkpoint.record_lineup(tournamentID, self.users_list)
+            self.save_ratings(self.users_list)
+
+        message = {
+            "title": "📋 Tournament lineup: ",
+            "description": self.get_users_rating_list(),
+        }
+
+        self.announce_standings(message)
+        self.update_projection(matches)
+
+    def poll_tournament(self, tournamentID):
+        matches = None
+        if self.poll_scheduler.active:
+            tournament, matches = self.challonge.show_tournament_with_matches(tournamentID)
+        else:
+            tournament = self.challonge.show_tournament(tournamentID)
+        if tournament['state'] == 'complete' or self.match_tracker.tournament_changed(tournament):
+            if matches is None:
+                matches = self.challonge.index_matches(tournamentID)
+            changed = self.process_matches(matches)
+            if changed and tournament['state'] != 'complete':
+                self.update_projection(matches)
+            self.publish_scoreboard()
+            self.match_tracker.mark_tournament_seen(tournament)
+        else:
+            logger.debug("Tournament has not changed since the last poll")
+            changed = 0
+        return tournament['state'], changed
+
+    def watch_matches(self, tournamentID, state):
+        self.poll_scheduler.activity()
+        while not self.poll_scheduler.stopped:
+            try:
+                state, changed = self.poll_tournament(tournamentID)
+            except Exception as ex:
+                if not is_transient(ex):
+                    raise
+                logger.warning("Polling failed, retrying later. ERROR: %s", ex)
+                self.poll_scheduler.rate_limited(get_retry_after(ex))
+                self.poll_scheduler.sleep()
+                continue
+
+            if state == 'complete':
+                break
+            if changed:
+                self.poll_scheduler.activity()
+            else:
+                self.poll_scheduler.idle()
+            self.poll_scheduler.sleep()
+
+    def announce_results(self, tournamentID):
+        self.close_projections()
+        flushed = self.flush_sheet_updates()
+        logger.debug("The tournament is over. ID: %s", tournamentID)
+        message = {
+            "title": "📋 Tournament is over! Updated rating:",
+            "description": self.get_users_rating_list(),
+        }
+
+        self.announce_standings(message)
+        if flushed:
+            self.checkpoint.finish()
+
+    def run_tournament(self, tournament_url, watcher):
+        metrics_since = registry.snapshot()
+        try:
+            tournamentID, state = self.wait_for_tournament_start(tournament_url)
+
+            if state != "complete" or self.checkpoint.exists():
+                self.announce_lineup(tournamentID)
+                watcher(tournamentID, state)
+                if not self.poll_scheduler.stopped:
+                    self.announce_results(tournamentID)
+
+        except ValueError as ex:
+            logger.error(ex.args[0])
+        except Exception as ex:
+            if get_status(ex) == 404:
+                logger.error("Tournament with URL: %s not found. ERROR: %s", tournament_url, ex)
+            else:
+                logger.exception("Tournament with URL: %s failed. ERROR: %s", tournament_url, ex)
+        finally:
+            self.close_projections()
+            self.flush_sheet_updates()
+            self.publish_scoreboard(force=True)
+            self.sender.flush()
+            try:
+                registry.write_summary(tournament_url, metrics_since)
+            except OSError as ex:
+                logger.error("Failed to write the metrics summary. ERROR: %s", ex)
+            self.users_list.close()
+
+    def start_polling(self, tournament_url):
+        self.run_tournament(tournament_url, self.watch_matches)
+
+    def start_webhook(self, tournament_url, host, port):
+        from webhook_server import WebhookReceiver
+
+        def watch_webhook_events(tournamentID, state):
+            receiver = WebhookReceiver(tournamentID, self.process_webhook_match, self.poll_tournament, host=host,
+                                       port=port, stop_event=self.poll_scheduler.stop_event)
+            receiver.run()
+
+        self.run_tournament(tournament_url, watch_webhook_events)
+
+    def process_webhook_match(self, tournamentID, match_id):
+        logger.debug("Match %s was reported, refreshing the match list", match_id)
+        matches = self.challonge.index_matches(tournamentID)
+        changed = self.process_matches(matches)
+        if changed:
+            self.update_projection(matches)
+        self.publish_scoreboard()
+        return changed
+
+
+def initialize_match(tournament_url=os.getenv("TOURNAMENT_URL"), mode="poll", host=None, port=None,
+                     scoreboard=False):
     logger.debug(tournament_url)
 
     logger.debug("Start application")
+    import challonge
+
     challonge.set_credentials(os.getenv('CHALLONGE_LOGIN'), os.getenv('CHALLONGE_API_KEY'))
-    start_polling(tournament_url)
+    start_metrics_server()
+    config = TournamentConfig(tournament_url, mode=mode, webhook_host=host, webhook_port=port, scoreboard=scoreboard)
+    TournamentSession(config).run()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Tournament Link Parser.')
 
     parser.add_argument('--url', type=str, help='Tournament URL')
+    parser.add_argument('--mode', choices=['poll', 'webhook'], default='poll',
+                        help='Poll Challonge for changes or receive Challonge webhooks')
+    parser.add_argument('--webhook-host', type=str, default=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+                        help='Address the webhook receiver listens on')
+    parser.add_argument('--webhook-port', type=int, default=int(os.getenv('WEBHOOK_PORT', 8080)),
+                        help='Port the webhook receiver listens on')
+    parser.add_argument('--live-scoreboard', action='store_true',
+                        default=os.getenv('LIVE_SCOREBOARD', '').lower() in ('1', 'true', 'yes'),
+                        help='Keep one live standings message updated instead of posting every event')
+    parser.add_argument('--log-level', type=str.upper, default=os.getenv('LOG_LEVEL', 'DEBUG'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Logging level')
     args = parser.parse_args()
+    set_level(args.log_level)
 
-    if args.url is not None:
-        initialize_match(args.url)
-    else:
-        initialize_match()
+    tournament_url = args.url if args.url is not None else os.getenv("TOURNAMENT_URL")
+    initialize_match(tournament_url, args.mode, args.webhook_host, args.webhook_port, args.live_scoreboard)
@@ -1,9 +1,17 @@
+import threading
+from bisect import bisect_left, insort
+
+
 class User:
+    __slots__ = ('id', 'username', 'elo_value', 'calibration', 'r_win', 'r_lose', 'rating_sum', 'winner',
+                 'matches_played', 'matches_won', 'tournaments_played', 'indexes')
+
     def __init__(self, username, elo, calibration, id=-1, matches_played=0, matches_won=0, tournaments_played=1,
                  rating_sum=0, r_win=0, r_lose=0, winner=False):
+        self.indexes = ()
         self.id = id
         self.username = username
-        self.elo = elo
+        self.elo_value = elo
         self.calibration = calibration
         self.r_win = r_win
         self.r_lose = r_lose
@@ -12,3 +20,172 @@ class User:
         self.matches_played = matches_played
         self.matches_won = matches_won
         self.tournaments_played = tournaments_played
+
+    @property
+    def elo(self):
+        return self.elo_value
+
+    @elo.setter
+    def elo(self, elo):
+        previous = self.elo_value
+        self.elo_value = elo
+        for index in self.indexes:
+            index.move(self, previous)
+
+
+def get_user_field(name):
+    return property(lambda self: getattr(self.user, name), lambda self, value: setattr(self.user, name, value))
+
+
+class Participant:
+    __slots__ = ('user', 'id', 'r_win', 'r_lose', 'rating_sum', 'winner')
+
+    username = property(lambda self: self.user.username)
+    elo = get_user_field('elo')
+    calibration = get_user_field('calibration')
+    matches_played = get_user_field('matches_played')
+    matches_won = get_user_field('matches_won')
+    tournaments_played = get_user_field('tournaments_played')
+    indexes = get_user_field('indexes')
+
+    def __init__(self, user, id=-1, rating_sum=0, r_win=0, r_lose=0, winner=False):
+        self.user = user
+        self.id = id
+        self.r_win = r_win
+        self.r_lose = r_lose
+        self.rating_sum = rating_sum
+        self.winner = winner
+
+
+class RatingIndex:
+    def __init__(self):
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def add(self, user):
+        with self.lock:
+            insort(self.keys, (-user.elo, user.username))
+        user.indexes += (self,)
+
+    def add_many(self, users):
+        with self.lock:
+            self.keys.extend((-user.elo, user.username) for user in users)
+            self.keys.sort()
+        for user in users:
+            user.indexes += (self,)
+
+    def remove(self, user):
+        user.indexes = tuple(index for index in user.indexes if index is not self)
+        with self.lock:
+            position = bisect_left(self.keys, (-user.elo, user.username))
+            if position < len(self.keys) and self.keys[position] == (-user.elo, user.username):
+                del self.keys[position]
+
+    def move(self, user, previous_elo):
+        with self.lock:
+            position = bisect_left(self.keys, (-previous_elo, user.username))
+            if position < len(self.keys) and self.keys[position] == (-previous_elo, user.username):
+                del self.keys[position]
+            insort(self.keys, (-user.elo, user.username))
+
+    def get_rank(self, elo):
+        with self.lock:
+            return bisect_left(self.keys, (-elo,)) + 1
+
+    def get_top(self, count):
+        with self.lock:
+            return [username for _, username in self.keys[:count]]
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class UserRegistry:
+    def __init__(self, users=()):
+        self.by_username = {}
+        self.by_id = {}
+        self.ratings = RatingIndex()
+        for user in users:
+            self.add(user)
+
+    def add(self, user):
+        previous = self.by_username.get(user.username)
+        if previous is not None and previous is not user:
+            if self.by_id.get(previous.id) is previous:
+                del self.by_id[previous.id]
+            self.ratings.remove(previous)
+        if previous is not user:
+            self.ratings.add(user)
+        self.by_username[user.username] = user
+        if user.id != -1:
+            self.by_id[user.id] = user
+        return user
+
+    def add_many(self, users):
+        added = {}
+        for user in users:
+            if user.username in self.by_username:
+                self.add(user)
+            else:
+                added[user.username] = user
+        for user in added.values():
+            self.by_username[user.username] = user
+            if user.id != -1:
+                self.by_id[user.id] = user
+        self.ratings.add_many(list(added.values()))
+
+    def update(self, user):
+        existing = self.by_username.get(user.username)
+        if existing is None:
+            return self.add(user)
+        existing.elo = user.elo
+        existing.calibration = user.calibration
+        existing.matches_played = user.matches_played
+        existing.matches_won = user.matches_won
+        existing.tournaments_played = user.tournaments_played
+        return existing
+
+    def set_id(self, user, id):
+        if self.by_id.get(user.id) is user:
+            del self.by_id[user.id]
+        user.id = id
+        if id != -1:
+            self.by_id[id] = user
+
+    def get_by_id(self, id):
+        return self.by_id.get(id)
+
+    def get_by_username(self, username):
+        return self.by_username.get(username)
+
+    def get_rank(self, user):
+        return self.ratings.get_rank(user.elo)
+
+    def get_top(self, count):
+        return [self.by_username[username] for username in self.ratings.get_top(count)]
+
+    def get_standings(self):
+        return self.get_top(len(self))
+
+    def close(self):
+        for user in self.by_username.values():
+            user.indexes = tuple(index for index in user.indexes if index is not self.ratings)
+
+    def clear(self):
+        self.close()
+        self.ratings.clear()
+        self.by_username.clear()
+        self.by_id.clear()
+
+    def __contains__(self, username):
+        return username in self.by_username
+
+    def __iter__(self):
+        return iter(self.by_username.values())
+
+    def __len__(self):
+        return len(self.by_username)
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+from time import sleep
+
+import requests
+
+from logger import get_logger, set_level
+
+logger = get_logger(os.path.basename(__file__))
+
+
+def build_events(args):
+    if args.events_file:
+        with open(args.events_file) as file:
+            return [json.loads(line) for line in file if line.strip()]
+    events = [{"match": {"id": match_id, "tournament_id": args.tournament, "state": args.state}}
+              for match_id in args.match]
+    if args.complete:
+        events.append({"tournament": {"id": args.tournament, "state": "complete"}})
+    return events
+
+
+def send_events(url, events, delay=0, token=None):
+    headers = {'X-Webhook-Token': token} if token else {}
+    for event in events:
+        response = requests.post(url, json=event, headers=headers)
+        logger.debug('Sent event %s. Response status - %s', event, response.status_code)
+        sleep(delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Send fake Challonge webhook events to a local receiver.')
+
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8080/challonge', help='Receiver URL')
+    parser.add_argument('--tournament', type=int, required=True, help='Tournament ID')
+    parser.add_argument('--match', type=int, action='append', default=[], help='Match ID, can be repeated')
+    parser.add_argument('--state', type=str, default='complete', help='Match state to report')
+    parser.add_argument('--complete', action='store_true', help='Finish with a tournament complete event')
+    parser.add_argument('--events-file', type=str, help='JSON lines file with raw event payloads')
+    parser.add_argument('--delay', type=float, default=0, help='Delay between events in seconds')
+    parser.add_argument('--token', type=str, default=os.getenv('WEBHOOK_SECRET'), help='Shared webhook secret')
+    parser.add_argument('--log-level', type=str.upper, default=os.getenv('LOG_LEVEL', 'DEBUG'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Logging level')
+    args = parser.parse_args()
+    set_level(args.log_level)
+
+    send_events(args.url, build_events(args), args.delay, args.token)
@@ -0,0 +1,112 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from logger import get_logger
+
+logger = get_logger(os.path.basename(__file__))
+
+
+def parse_event(payload):
+    if 'data' in payload and isinstance(payload['data'], dict):
+        data = payload['data']
+        attributes = data.get('attributes', {})
+        relationships = data.get('relationships', {})
+        tournament = relationships.get('tournament', {}).get('data') or {}
+        return data.get('type'), data.get('id'), tournament.get('id'), attributes.get('state')
+    for kind in ('match', 'tournament'):
+        if kind in payload and isinstance(payload[kind], dict):
+            item = payload[kind]
+            tournament_id = item.get('tournament_id') if kind == 'match' else item.get('id')
+            return kind, item.get('id'), tournament_id, item.get('state')
+    return None, None, None, None
+
+
+class WebhookReceiver:
+    RECONCILE_INTERVAL = float(os.getenv('WEBHOOK_RECONCILE_INTERVAL', 60))
+
+    def __init__(self, tournament_id, on_match, on_reconcile, host='0.0.0.0', port=8080, path='/challonge',
+                 secret=os.getenv('WEBHOOK_SECRET'), reconcile_interval=RECONCILE_INTERVAL, stop_event=None):
+        self.tournament_id = tournament_id
+        self.on_match = on_match
+        self.on_reconcile = on_reconcile
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.reconcile_interval = reconcile_interval
+        self.stop_event = stop_event
+        self.lock = None
+        self.complete = None
+        self.tasks = set()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.lock = asyncio.Lock()
+        self.complete = asyncio.Event()
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_event)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        logger.debug('Webhook receiver listening on %s:%s%s', self.host, self.port, self.path)
+        try:
+            await self.reconcile()
+            while not self.complete.is_set():
+                if self.stop_event is not None and self.stop_event.is_set():
+                    logger.debug("Webhook receiver was asked to stop")
+                    break
+                try:
+                    await asyncio.wait_for(self.complete.wait(), self.reconcile_interval)
+                except asyncio.TimeoutError:
+                    await self.reconcile()
+        finally:
+            await runner.cleanup()
+            logger.debug("Webhook receiver stopped")
+
+    async def handle_event(self, request):
+        if self.secret and self.secret not in (request.query.get('token'), request.headers.get('X-Webhook-Token')):
+            logger.warning("Rejected a webhook event with an invalid token")
+            return web.Response(status=403)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Invalid JSON")
+
+        kind, item_id, tournament_id, state = parse_event(payload)
+        logger.debug('Webhook event received. Type - %s. ID - %s. State - %s', kind, item_id, state)
+        if kind is None or item_id is None:
+            return web.Response(status=400, text="Unknown event")
+        if tournament_id is not None and str(tournament_id) != str(self.tournament_id):
+            logger.debug('Ignoring event for tournament %s', tournament_id)
+            return web.Response(status=202)
+
+        if kind == 'match':
+            task = asyncio.create_task(self.process_match(item_id))
+        else:
+            task = asyncio.create_task(self.reconcile())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.Response(status=200)
+
+    async def process_match(self, match_id):
+        async with self.lock:
+            try:
+                await asyncio.to_thread(self.on_match, self.tournament_id, match_id)
+            except Exception as ex:
+                logger.error('Failed to process webhook event for match %s. ERROR: %s', match_id, ex)
+
+    async def reconcile(self):
+        async with self.lock:
+            try:
+                state, changed = await asyncio.to_thread(self.on_reconcile, self.tournament_id)
+            except Exception as ex:
+                logger.error('Reconciliation poll failed. ERROR: %s', ex)
+                return
+        logger.debug('Reconciliation poll finished. %s matches changed', changed)
+        if state == 'complete':
+            self.complete.set()